@@ -1,18 +1,39 @@
 from flask import Flask
 from flask_login import LoginManager
-from werkzeug.security import generate_password_hash
-from models import db, User, ServiceCategory, PatientCategory
-import os
+from models import db
+from jobs import JobRunner
+from sequences import SequenceAllocator
+from user_cache import UserCache, load_user
+from passwords import PasswordHasher
+from invoice_cache import InvoiceCache
+import catalog
+import estimate_storage
+import rollups
+import migrations
+import applog
+import metrics
+import query_plans
+import query_budget
+import sqlite_tuning
+from config import get_profile
 
-def create_app():
+def create_app(config=None, profile=None):
+    """Build the app from a config profile (APP_PROFILE by default) plus ``config`` overrides."""
     app = Flask(__name__)
-    app.debug = True
-    app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET', 'dev-secret-change-me')
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hospital_estimate.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.from_object(get_profile(profile))
+    if config:
+        app.config.update(config)
+    if not app.config.get('SECRET_KEY'):
+        raise ValueError('SECRET_KEY is not set; set FLASK_SECRET before starting this profile')
     
     # Initialize extensions
+    applog.init_app(app)
     db.init_app(app)
+    sqlite_tuning.init_app(app, db)
+    # A new app may point at another database; don't trust a catalog version read from the old one
+    catalog.reset()
+    JobRunner(app)
+    SequenceAllocator(app, 'estimate_number', block_size=app.config.get('ESTIMATE_NUMBER_BLOCK_SIZE', 1))
     
     # Login manager configuration
     login_manager = LoginManager()
@@ -20,65 +41,65 @@ def create_app():
     login_manager.login_message = 'Please log in to access this page.'
     login_manager.init_app(app)
     
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    # Identity records come from an in-process TTL cache, not a per-request query
+    UserCache(app)
+    PasswordHasher(app)
+    InvoiceCache(app)
+    login_manager.user_loader(load_user)
     
     # Register blueprints
     from routes import main
     app.register_blueprint(main)
+    metrics.init_app(app, main, db)
+    query_budget.init_app(app)
     
-    # Create tables and default data
+    # Create or upgrade the schema and seed default data (one query when up to date)
     with app.app_context():
-        db.create_all()
-        create_default_data()
+        migrations.upgrade()
     
-    return app
-
-def create_default_data():
-    """Create default categories and admin user"""
-    
-    print("\n=== Creating Default Data ===")
+    @app.cli.command('migrate')
+    def migrate():
+        """Apply pending schema migrations."""
+        applied = migrations.upgrade()
+        print(f"Applied migrations: {applied or 'none'}; schema version {migrations.current_version()}")
     
-    # Service categories
-    service_cats = [
-        ('nursing', 'Nursing'), ('room', 'Room Charges'), ('doctor', 'Doctor Visit'),
-        ('laboratory', 'Laboratory'), ('radiology', 'Radiology'), ('pharmacy', 'Pharmacy'),
-        ('equipment', 'Equipment'), ('procedures', 'Procedures'), ('surgery', 'Surgery')
-    ]
-    print("\nService Categories to create:", service_cats)
+    @app.cli.command('compact-estimates')
+    def compact_estimates():
+        """Convert saved estimates still stored as plain JSON to the compact format."""
+        print(f"Converted {estimate_storage.compact_existing()} saved estimates")
     
-    # Patient categories  
-    patient_cats = [
-        ('charity', 'Charity'), ('general_nc_a', 'General NC A'), ('general_nc_b', 'General NC B'),
-        ('general', 'General'), ('deluxe', 'Deluxe'), ('super_deluxe', 'Super Deluxe')
-    ]
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups():
+        """Recompute the daily estimate rollups from the saved estimates."""
+        counts = rollups.rebuild()
+        db.session.commit()
+        print('Rebuilt rollup rows: ' + ', '.join(f'{name} {count}' for name, count in counts.items()))
     
-    # Create categories if they don't exist
-    for name, display_name in service_cats:
-        if not ServiceCategory.query.filter_by(name=name).first():
-            db.session.add(ServiceCategory(name=name, display_name=display_name))
+    @app.cli.command('check-query-plans')
+    def check_query_plans():
+        """Fail if any hot query would scan a whole table or sort without an index."""
+        failed = False
+        for name, (plan, problems) in query_plans.check().items():
+            failed = failed or bool(problems)
+            print(f"{'FAIL' if problems else 'ok  '} {name}: {'; '.join(plan)}")
+        if failed:
+            raise SystemExit(1)
     
-    for name, display_name in patient_cats:
-        if not PatientCategory.query.filter_by(name=name).first():
-            db.session.add(PatientCategory(name=name, display_name=display_name))
+    @app.cli.command('check-query-budgets')
+    def check_query_budgets():
+        """Fail if an endpoint exceeds its SQL budget or issues more statements as data grows."""
+        failed = False
+        for call, (counts, budget, problems) in query_budget.check(create_app).items():
+            failed = failed or bool(problems)
+            print(f"{'FAIL' if problems else 'ok  '} {call}: {' -> '.join(map(str, counts))} of {budget}"
+                  f"{'; ' + '; '.join(problems) if problems else ''}")
+        if failed:
+            raise SystemExit(1)
     
-    # Create admin user
-    if not User.query.filter_by(username='admin').first():
-        admin = User(username='admin', role='admin', approved=True, rejected=False)
-        admin.set_password('admin')
-        db.session.add(admin)
-    
-    # Create test user for user dashboard
-    if not User.query.filter_by(username='testuser').first():
-        user = User(username='testuser', role='user', approved=True, rejected=False)
-        user.set_password('testuser')
-        db.session.add(user)
-    
-    db.session.commit()
+    return app
 
 # Create app instance
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    app.run()
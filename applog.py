@@ -0,0 +1,117 @@
+"""Structured application logging.
+
+Records are emitted as one JSON object per line carrying the level, message,
+the per-request correlation id and any keyword fields passed by the caller.
+Request threads only put records on an in-memory queue; a background
+listener thread does the formatting and the actual write, so logging never
+blocks a request on stdout.
+
+DEBUG output is sampled per request (LOG_DEBUG_SAMPLE_RATE) so it can be left
+on under load, and the helpers below return before building anything when
+their level is disabled.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime
+
+from flask import g, has_request_context, request
+
+logger = logging.getLogger('hospital_estimate')
+
+
+def debug(message, **fields):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(message, extra={'fields': fields})
+
+
+def info(message, **fields):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(message, extra={'fields': fields})
+
+
+def warning(message, **fields):
+    if logger.isEnabledFor(logging.WARNING):
+        logger.warning(message, extra={'fields': fields})
+
+
+def exception(message, **fields):
+    """Log at ERROR with the current exception's traceback."""
+    logger.error(message, exc_info=True, extra={'fields': fields})
+
+
+def request_id():
+    return g.get('request_id') if has_request_context() else None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.utcfromtimestamp(record.created).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the correlation id and drop DEBUG records of unsampled requests."""
+
+    def filter(self, record):
+        record.request_id = request_id()
+        if record.levelno <= logging.DEBUG and has_request_context():
+            return g.get('log_sampled', True)
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Hand the record over unformatted; the listener thread does the JSON work.
+        # Tracebacks are rendered here since exc_info cannot safely cross threads.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
+
+
+def init_app(app):
+    level = logging.getLevelName(str(app.config.get('LOG_LEVEL', 'INFO')).upper())
+    sample_rate = float(app.config.get('LOG_DEBUG_SAMPLE_RATE', 1.0))
+
+    if not any(isinstance(h, _QueueHandler) for h in logger.handlers):
+        log_queue = queue.SimpleQueue()
+        handler = _QueueHandler(log_queue)
+        handler.addFilter(RequestContextFilter())
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter())
+        listener = logging.handlers.QueueListener(log_queue, output)
+        listener.start()
+        atexit.register(listener.stop)
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.log_sampled = sample_rate >= 1.0 or random.random() < sample_rate
+
+    @app.after_request
+    def echo_request_id(response):
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+        return response
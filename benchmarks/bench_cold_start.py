@@ -0,0 +1,66 @@
+"""Worker cold-start benchmark.
+
+Starts a fresh interpreter per run, as a new worker process would, and times
+``import app`` plus ``create_app()`` against a scratch SQLite file: first on
+an empty database, then repeatedly on the already-initialised one (the usual
+deploy/restart case). Also reports the SQL statements issued by startup.
+
+    python -m benchmarks.bench_cold_start --runs 10
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+_CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+from app import create_app
+imported = time.perf_counter()
+statements.clear()
+create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1]})
+finished = time.perf_counter()
+print(json.dumps({'import_s': imported - started, 'create_app_s': finished - imported,
+                  'statements': len(statements)}))
+'''
+
+
+def _start(url, cwd):
+    output = subprocess.run([sys.executable, '-c', _CHILD, url], cwd=cwd, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workdir = tempfile.mkdtemp(prefix='bench-start-')
+    try:
+        # Importing app builds the module-level app; point it at the scratch dir too
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'module.db')}"
+        url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        first = _start(url, repo)
+        warm = [_start(url, repo) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"empty database:  create_app {first['create_app_s'] * 1000:8.1f} ms, "
+          f"{first['statements']} statements")
+    print(f"initialised db:  create_app {statistics.median(r['create_app_s'] for r in warm) * 1000:8.1f} ms "
+          f"(median of {len(warm)}), {warm[-1]['statements']} statements; "
+          f"import {statistics.median(r['import_s'] for r in warm) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
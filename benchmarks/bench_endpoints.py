@@ -0,0 +1,216 @@
+"""Endpoint microbenchmarks against a synthetic dataset.
+
+Times the hot API calls through the Flask test client (no network) on a
+working copy of a benchmarks.datagen dataset, then writes per-benchmark
+latency percentiles to a JSON file tagged with the current git commit.
+Pass ``--compare`` an earlier result file to print the change per benchmark.
+
+    python -m benchmarks.bench_endpoints                      # full 100k / 1M dataset
+    python -m benchmarks.bench_endpoints --services 10000 --estimates 50000
+    python -m benchmarks.bench_endpoints --compare benchmarks/results/<old>.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks import datagen
+
+DEFAULT_RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+UPLOAD_ROWS = 5000
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        'iterations': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'p50_ms': round(percentile(50) * 1000, 3),
+        'p95_ms': round(percentile(95) * 1000, 3),
+        'p99_ms': round(percentile(99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def _timed(call, iterations, warmup):
+    for _ in range(warmup):
+        call()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = call()
+        samples.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            raise RuntimeError(f'benchmark request failed with {response.status_code}: '
+                               f'{response.get_data(as_text=True)[:200]}')
+    return _summary(samples)
+
+
+def _services_csv(rng, rows, categories):
+    out = io.StringIO()
+    out.write('name,category_name,cost_price,mrp,is_daily_charge\n')
+    for i in range(rows):
+        mrp = rng.randint(50, 50_000)
+        out.write(f'Uploaded service {i},{rng.choice(categories)},{mrp // 2},{mrp},{rng.random() < 0.15}\n')
+    return out.getvalue().encode('utf-8')
+
+
+def _discounts_csv(rng, patient_categories, categories):
+    out = io.StringIO()
+    out.write('patient_category,service_category,discount_type,discount_value\n')
+    for patient_category in patient_categories:
+        for category in categories:
+            out.write(f'{patient_category},{category},percentage,{rng.randint(0, 40)}\n')
+    return out.getvalue().encode('utf-8')
+
+
+def run(app, iterations, upload_iterations, seed):
+    """Run every benchmark against ``app``; returns ``{name: summary}``."""
+    rng = random.Random(seed)
+    client = app.test_client()
+    client.post('/api/login', json={'username': 'admin', 'password': 'admin'})
+    staff = app.test_client()
+    staff.post('/api/login', json={'username': 'staff000', 'password': datagen.BENCH_PASSWORD})
+
+    services = client.get('/api/services?limit=1000').get_json()['services']
+    service_ids = [s['id'] for s in services]
+    categories = [c['name'] for c in client.get('/api/service-categories').get_json()]
+    patient_categories = [c['name'] for c in client.get('/api/patient-categories').get_json()]
+
+    def estimate_request():
+        return {
+            'patient_name': 'Bench Patient', 'patient_uhid': 'UH000001',
+            'patient_category': rng.choice(patient_categories),
+            'length_of_stay': rng.randint(1, 14),
+            'selected_services': rng.sample(service_ids, 10)
+        }
+
+    def save_estimate():
+        request_body = estimate_request()
+        estimate = client.post('/api/generate-estimate', json=request_body).get_json()
+        started = time.perf_counter()
+        response = staff.post('/api/save-estimate', json=dict(request_body, estimate_data=estimate))
+        return response, time.perf_counter() - started
+
+    def upload(url, body, name):
+        return client.post(url, data={'file': (io.BytesIO(body), name)}, content_type='multipart/form-data')
+
+    results = {
+        'generate_estimate': _timed(
+            lambda: client.post('/api/generate-estimate', json=estimate_request()), iterations, 5),
+        'get_services': _timed(lambda: client.get('/api/services'), max(3, iterations // 10), 1),
+        'get_services_page': _timed(
+            lambda: client.get(f'/api/services?limit=100&category={rng.choice(categories)}'), iterations, 5),
+        'get_saved_estimates': _timed(lambda: staff.get('/api/saved-estimates'), max(3, iterations // 10), 1),
+        'get_saved_estimates_page': _timed(
+            lambda: client.get('/api/saved-estimates?view_all=true&limit=50'), iterations, 5),
+    }
+
+    samples = []
+    for i in range(iterations + 5):
+        response, elapsed = save_estimate()
+        if response.status_code >= 400:
+            raise RuntimeError(f'save-estimate failed: {response.get_data(as_text=True)[:200]}')
+        if i >= 5:
+            samples.append(elapsed)
+    results['save_estimate'] = _summary(samples)
+
+    services_csv = _services_csv(rng, UPLOAD_ROWS, categories)
+    results['bulk_upload_services'] = dict(_timed(
+        lambda: upload('/api/bulk-upload/services', services_csv, 'services.csv'), upload_iterations, 0),
+        rows=UPLOAD_ROWS)
+    discounts_csv = _discounts_csv(rng, patient_categories, categories)
+    results['bulk_upload_discounts'] = dict(_timed(
+        lambda: upload('/api/bulk-upload/discounts', discounts_csv, 'discounts.csv'), upload_iterations, 1),
+        rows=len(patient_categories) * len(categories))
+    return results
+
+
+def compare(previous, current):
+    print(f"\ncompared with {previous.get('commit')} ({previous.get('timestamp')}):")
+    for name, summary in current['results'].items():
+        before = previous.get('results', {}).get(name)
+        if not before:
+            print(f'  {name:<26} new')
+            continue
+        change = (summary['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+        print(f"  {name:<26} p50 {before['p50_ms']:>10.3f} -> {summary['p50_ms']:>10.3f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    datagen.add_arguments(parser)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--upload-iterations', type=int, default=5)
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<commit>-<time>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    args = parser.parse_args()
+
+    from app import create_app
+    dataset = datagen.ensure_dataset(create_app, args.services, args.estimates, args.users, args.seed,
+                                     args.data_dir)
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    try:
+        # Benchmarks write (saves, uploads); keep the cached dataset pristine
+        working_copy = os.path.join(workdir, 'bench.db')
+        shutil.copyfile(dataset, working_copy)
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{working_copy}'})
+        started = time.perf_counter()
+        results = run(app, args.iterations, args.upload_iterations, args.seed)
+        elapsed = time.perf_counter() - started
+        with app.app_context():
+            from models import db
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'commit': _commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'dataset': {'services': args.services, 'estimates': args.estimates, 'users': args.users,
+                    'seed': args.seed},
+        'iterations': args.iterations,
+        'seconds': round(elapsed, 1),
+        'results': results,
+    }
+    output = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR, f"{report['commit']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for name, summary in results.items():
+        print(f"{name:<26} p50 {summary['p50_ms']:>10.3f} ms  p95 {summary['p95_ms']:>10.3f} ms  "
+              f"p99 {summary['p99_ms']:>10.3f} ms  (n={summary['iterations']})")
+    print(f'wrote {output}')
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Concurrent estimate-number allocation benchmark.
+
+Many threads save SavedEstimate rows at once against a scratch SQLite file,
+numbering them either the legacy way (read the latest row, add one, retry on
+a unique-constraint collision) or through sequences.SequenceAllocator.
+
+    python -m benchmarks.bench_estimate_numbers --threads 16 --saves 200
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from flask import Flask
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from models import db, User, SavedEstimate
+from sequences import SequenceAllocator, next_estimate_number
+
+
+def make_app(path, block_size):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    db.init_app(app)
+    SequenceAllocator(app, 'estimate_number', block_size=block_size)
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', role='user', approved=True, rejected=False, password='x')
+        db.session.add(user)
+        db.session.commit()
+    return app
+
+
+def legacy_number():
+    last_estimate = SavedEstimate.query.order_by(SavedEstimate.id.desc()).first()
+    return f"EST{int(last_estimate.estimate_number[3:]) + 1:03d}" if last_estimate else "EST001"
+
+
+def save(number_func):
+    """Save one estimate, retrying on collisions; returns the number of retries."""
+    retries = 0
+    while True:
+        try:
+            db.session.add(SavedEstimate(
+                estimate_number=number_func(), patient_name='Bench', patient_category='general',
+                length_of_stay=1, subtotal=100, total_discount=0, final_total=100,
+                generated_by_role='user', generated_by_user_id=1, estimate_data='{}'
+            ))
+            db.session.commit()
+            return retries
+        except (IntegrityError, OperationalError):
+            db.session.rollback()
+            retries += 1
+
+
+def run(mode, threads, saves):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    block_size = {'legacy': 1, 'allocator': 1, 'allocator-block': 64}[mode]
+    app = make_app(path, block_size)
+    number_func = legacy_number if mode == 'legacy' else next_estimate_number
+    retries = []
+
+    def worker():
+        with app.app_context():
+            retries.append(sum(save(number_func) for _ in range(saves)))
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        saved = SavedEstimate.query.count()
+        db.engine.dispose()
+    os.remove(path)
+    return {'mode': mode, 'threads': threads, 'saved': saved, 'retries': sum(retries),
+            'seconds': round(elapsed, 3), 'saves_per_second': round(saved / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--saves', type=int, default=100, help='saves per thread')
+    args = parser.parse_args()
+    for mode in ('legacy', 'allocator', 'allocator-block'):
+        result = run(mode, args.threads, args.saves)
+        print(f"{result['mode']:>16}: {result['saves_per_second']:>8} saves/s "
+              f"({result['saved']} saved, {result['retries']} retries, {result['seconds']}s)")
+
+
+if __name__ == '__main__':
+    main()
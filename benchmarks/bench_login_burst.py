@@ -0,0 +1,103 @@
+"""Effect of a login burst on concurrent estimate latency.
+
+Models a threaded worker: a fixed number of request threads serve a steady
+stream of /api/generate-estimate calls while a burst of /api/login calls
+arrives at once. Runs once with hashing inline on the request threads and
+once through the passwords process pool, and reports estimate latency
+percentiles (queueing included) during the burst.
+
+    python -m benchmarks.bench_login_burst --threads 8 --logins 40
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def run(create_app, mode, threads, logins, rate, seconds, wait):
+    workdir = tempfile.mkdtemp(prefix='bench-login-')
+    try:
+        config = {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}"}
+        if mode == 'inline':
+            config.update(PASSWORD_HASH_WORKERS=0, PASSWORD_HASH_MAX_PENDING=10_000)
+        else:
+            config.update(PASSWORD_HASH_WAIT=wait)
+        app = create_app(config)
+
+        client = app.test_client()
+        client.post('/api/login', json={'username': 'admin', 'password': 'admin'})
+        estimate = {'patient_name': 'Bench', 'patient_category': 'general', 'length_of_stay': 2,
+                    'selected_services': [1]}
+        with app.app_context():
+            from models import db, Service
+            db.session.add(Service(name='Bench service', category_id=1, cost_price=10, mrp=20))
+            db.session.commit()
+            import catalog
+            catalog.bump_version()
+        # Warm the snapshot and, in pool mode, start the hashing processes
+        client.post('/api/generate-estimate', json=estimate)
+        app.test_client().post('/api/login', json={'username': 'admin', 'password': 'admin'})
+
+        server = ThreadPoolExecutor(max_workers=threads)
+        latencies, statuses = [], {}
+        lock = threading.Lock()
+
+        def estimate_request(submitted):
+            client.post('/api/generate-estimate', json=estimate)
+            with lock:
+                latencies.append(time.perf_counter() - submitted)
+
+        def login_request():
+            status = app.test_client().post('/api/login', json={'username': 'admin', 'password': 'admin'}).status_code
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        for _ in range(logins):
+            server.submit(login_request)
+        interval = 1.0 / rate
+        next_at = started
+        while next_at < started + seconds:
+            time.sleep(max(0.0, next_at - time.perf_counter()))
+            server.submit(estimate_request, time.perf_counter())
+            next_at += interval
+        server.shutdown(wait=True)
+        elapsed = time.perf_counter() - started
+        with app.app_context():
+            from models import db
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {'mode': mode, 'estimates': len(latencies), 'logins': statuses, 'seconds': round(elapsed, 2),
+            'p50_ms': round(_percentile(latencies, 50) * 1000, 1),
+            'p99_ms': round(_percentile(latencies, 99) * 1000, 1),
+            'max_ms': round(max(latencies) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8, help='request threads')
+    parser.add_argument('--logins', type=int, default=40, help='logins in the burst')
+    parser.add_argument('--rate', type=float, default=50, help='estimate requests per second')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--wait', type=float, default=0.5, help='PASSWORD_HASH_WAIT for the pool run')
+    args = parser.parse_args()
+
+    from app import create_app
+    for mode in ('inline', 'pool'):
+        r = run(create_app, mode, args.threads, args.logins, args.rate, args.seconds, args.wait)
+        print(f"{r['mode']:>7}: estimate p50 {r['p50_ms']:>7} ms  p99 {r['p99_ms']:>7} ms  max {r['max_ms']:>7} ms "
+              f"({r['estimates']} estimates; login statuses {r['logins']}; {r['seconds']}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Concurrent read/write throughput under each configuration profile.
+
+Reader threads page through saved estimates while writer threads save new
+ones, all against a copy of the same benchmarks.datagen dataset, once per
+profile. Reports completed reads and writes per second, failed requests
+(e.g. "database is locked") and read latency percentiles. How far the
+profiles differ depends on the disk, the dataset size and the thread counts,
+so compare them on the host that will run the app.
+
+    python -m benchmarks.bench_sqlite_profiles --readers 8 --writers 4 --seconds 10
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from benchmarks import datagen
+
+
+def _percentile(samples, p):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def run(create_app, dataset, profile, readers, writers, seconds):
+    workdir = tempfile.mkdtemp(prefix='bench-profile-')
+    try:
+        path = os.path.join(workdir, 'bench.db')
+        shutil.copyfile(dataset, path)
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'SECRET_KEY': 'bench'},
+                         profile=profile)
+
+        setup = app.test_client()
+        setup.post('/api/login', json={'username': 'admin', 'password': 'admin'})
+        service_ids = [s['id'] for s in setup.get('/api/services?limit=20').get_json()['services']]
+        estimate_request = {'patient_name': 'Bench', 'patient_category': 'general',
+                            'length_of_stay': 3, 'selected_services': service_ids[:8]}
+        save_body = dict(estimate_request,
+                         estimate_data=setup.post('/api/generate-estimate', json=estimate_request).get_json())
+
+        counts = {'reads': 0, 'writes': 0, 'failed_reads': 0, 'failed_writes': 0}
+        read_latencies = []
+        lock = threading.Lock()
+        stop = threading.Event()
+        ready = threading.Barrier(readers + writers + 1)
+
+        def worker(index, writer):
+            client = app.test_client()
+            client.post('/api/login', json={'username': f'staff{index % 50:03d}',
+                                            'password': datagen.BENCH_PASSWORD})
+            ready.wait()
+            while not stop.is_set():
+                started = time.perf_counter()
+                if writer:
+                    response = client.post('/api/save-estimate', json=save_body)
+                else:
+                    response = client.get('/api/saved-estimates?limit=50')
+                elapsed = time.perf_counter() - started
+                kind = 'writes' if writer else 'reads'
+                with lock:
+                    if response.status_code >= 400:
+                        counts['failed_' + kind] += 1
+                    else:
+                        counts[kind] += 1
+                        if not writer:
+                            read_latencies.append(elapsed)
+
+        threads = [threading.Thread(target=worker, args=(i, i < writers)) for i in range(readers + writers)]
+        for t in threads:
+            t.start()
+        ready.wait()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+
+        with app.app_context():
+            from models import db
+            journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return dict(counts, profile=profile, journal_mode=journal_mode,
+                reads_per_second=round(counts['reads'] / seconds, 1),
+                writes_per_second=round(counts['writes'] / seconds, 1),
+                read_p50_ms=round(_percentile(read_latencies, 50) * 1000, 2),
+                read_p99_ms=round(_percentile(read_latencies, 99) * 1000, 2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    datagen.add_arguments(parser)
+    parser.set_defaults(services=10_000, estimates=100_000)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    from app import create_app
+    dataset = datagen.ensure_dataset(create_app, args.services, args.estimates, args.users, args.seed,
+                                     args.data_dir)
+    for profile in ('development', 'production'):
+        r = run(create_app, dataset, profile, args.readers, args.writers, args.seconds)
+        print(f"{r['profile']:>12} ({r['journal_mode']}): {r['reads_per_second']:>8} reads/s "
+              f"{r['writes_per_second']:>7} writes/s  failed {r['failed_reads']} reads, "
+              f"{r['failed_writes']} writes  read p50 {r['read_p50_ms']} ms p99 {r['read_p99_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""Seeded synthetic dataset for the benchmarks.
+
+Builds a SQLite database through the app's own create_app (so the schema,
+migrations and default categories/users are the real ones), then bulk-loads:
+
+- ``services`` services spread over the nine default service categories,
+- a discount for every patient category x service category pair,
+- ``users`` approved staff accounts,
+- ``estimates`` saved estimates, each with 3-12 SavedEstimateService lines
+  and a compact estimate_data payload built from those lines.
+
+The same seed and sizes always produce the same rows. Datasets are cached by
+their parameters, so only the first run pays for generation.
+
+    python -m benchmarks.datagen --services 100000 --estimates 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+import estimate_storage
+import rollups
+from models import db, User, Service, ServiceCategory, PatientCategory, Discount, \
+    SavedEstimate, SavedEstimateService, Sequence
+
+DEFAULT_SERVICES = 100_000
+DEFAULT_ESTIMATES = 1_000_000
+DEFAULT_USERS = 50
+DEFAULT_SEED = 42
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'hospital-estimate-bench')
+CHUNK_SIZE = 10_000
+BENCH_PASSWORD = 'bench'
+
+_WORDS = ('blood', 'serum', 'culture', 'panel', 'xray', 'ct', 'mri', 'scan', 'ward', 'icu',
+          'visit', 'consult', 'dressing', 'infusion', 'catheter', 'monitor', 'oxygen',
+          'ventilator', 'biopsy', 'suture', 'lipid', 'thyroid', 'renal', 'liver', 'cardiac')
+
+
+def dataset_path(data_dir, services, estimates, users, seed):
+    return os.path.join(data_dir, f'bench-s{services}-e{estimates}-u{users}-seed{seed}.db')
+
+
+def _chunks(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert(table, rows):
+    for chunk in _chunks(rows):
+        db.session.execute(table.insert(), chunk)
+        db.session.commit()
+
+
+def _services(rng, count, category_ids):
+    for i in range(count):
+        mrp = rng.randint(50, 50_000)
+        yield {
+            'name': f'{rng.choice(_WORDS).title()} {rng.choice(_WORDS)} {i}',
+            'category_id': category_ids[i % len(category_ids)],
+            'cost_price': round(mrp * rng.uniform(0.4, 0.8), 2),
+            'mrp': mrp,
+            'is_daily_charge': rng.random() < 0.15,
+            'visits_per_day': rng.choice((1, 1, 1, 2, 3))
+        }
+
+
+def _discounts(rng, patient_category_ids, category_ids):
+    for patient_category_id in patient_category_ids:
+        for category_id in category_ids:
+            percentage = rng.random() < 0.8
+            yield {
+                'patient_category_id': patient_category_id,
+                'service_category_id': category_id,
+                'discount_type': 'percentage' if percentage else 'fixed',
+                'discount_value': rng.randint(0, 40) if percentage else rng.randint(0, 500)
+            }
+
+
+def _estimates(rng, count, services, patient_categories, user_ids, lines_out):
+    """Yield SavedEstimate rows; their lines are appended to ``lines_out``."""
+    start = datetime(2024, 1, 1)
+    span = 2 * 365 * 24 * 3600
+    step = span / max(count, 1)
+    for n in range(1, count + 1):
+        patient_category = rng.choice(patient_categories)
+        length_of_stay = rng.randint(1, 14)
+        lines = []
+        for service_id, name, mrp, daily in rng.sample(services, rng.randint(3, 12)):
+            quantity = length_of_stay if daily else 1
+            line_total = mrp * quantity
+            discount = round(line_total * rng.choice((0, 0.05, 0.1, 0.2)), 2)
+            lines.append({
+                'service_id': service_id, 'service_name': name, 'quantity': quantity,
+                'unit_price': mrp, 'line_total': line_total,
+                'discount_amount': discount, 'final_amount': round(line_total - discount, 2)
+            })
+        subtotal = round(sum(line['line_total'] for line in lines), 2)
+        total_discount = round(sum(line['discount_amount'] for line in lines), 2)
+        summary = {'subtotal': subtotal, 'total_discount': total_discount,
+                   'final_total': round(subtotal - total_discount, 2)}
+        user_id = rng.choice(user_ids)
+        lines_out.extend(dict(line, saved_estimate_id=n) for line in lines)
+        yield {
+            'id': n,
+            'estimate_number': f'EST{n:03d}',
+            'patient_name': f'Patient {n}',
+            'patient_uhid': f'UH{rng.randint(100000, 999999)}',
+            'patient_category': patient_category,
+            'length_of_stay': length_of_stay,
+            'subtotal': subtotal,
+            'total_discount': total_discount,
+            'final_total': summary['final_total'],
+            'generated_by_role': 'user',
+            'generated_by_user_id': user_id,
+            'created_at': start + timedelta(seconds=int(n * step)),
+            'estimate_data': estimate_storage.encode({
+                'patient_details': {'name': f'Patient {n}', 'category': patient_category,
+                                    'length_of_stay': length_of_stay},
+                'estimate_lines': lines,
+                'summary': summary
+            })
+        }
+
+
+def _load_estimates(rng, count, services, patient_categories, user_ids):
+    estimates = SavedEstimate.__table__
+    lines_table = SavedEstimateService.__table__
+    lines = []
+    for chunk in _chunks(_estimates(rng, count, services, patient_categories, user_ids, lines)):
+        db.session.execute(estimates.insert(), chunk)
+        db.session.execute(lines_table.insert(), lines)
+        db.session.commit()
+        lines.clear()
+    db.session.merge(Sequence(name='estimate_number', next_value=count + 1))
+    db.session.commit()
+
+
+def populate(services, estimates, users, seed):
+    """Load the synthetic rows into the current app's (freshly created) database."""
+    rng = random.Random(seed)
+    category_ids = [c.id for c in ServiceCategory.query.order_by(ServiceCategory.id)]
+    patient_categories = PatientCategory.query.order_by(PatientCategory.id).all()
+
+    _insert(Service.__table__, _services(rng, services, category_ids))
+    _insert(Discount.__table__, _discounts(rng, [p.id for p in patient_categories], category_ids))
+
+    password = generate_password_hash(BENCH_PASSWORD)
+    _insert(User.__table__, ({
+        'username': f'staff{i:03d}', 'password': password, 'role': 'user',
+        'approved': True, 'rejected': False, 'created_at': datetime(2024, 1, 1)
+    } for i in range(users)))
+    user_ids = [u.id for u in User.query.filter(User.username.like('staff%'))]
+
+    catalog = [(s.id, s.name, float(s.mrp), s.is_daily_charge) for s in db.session.query(
+        Service.id, Service.name, Service.mrp, Service.is_daily_charge).order_by(Service.id)]
+    _load_estimates(rng, estimates, catalog, [p.name for p in patient_categories], user_ids)
+
+
+def ensure_dataset(create_app, services=DEFAULT_SERVICES, estimates=DEFAULT_ESTIMATES,
+                   users=DEFAULT_USERS, seed=DEFAULT_SEED, data_dir=DEFAULT_DATA_DIR):
+    """Return the path of the dataset for these parameters, generating it if needed."""
+    path = dataset_path(data_dir, services, estimates, users, seed)
+    if os.path.exists(path):
+        return path
+    os.makedirs(data_dir, exist_ok=True)
+    partial = path + '.partial'
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    started = time.perf_counter()
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{partial}'})
+    with app.app_context():
+        populate(services, estimates, users, seed)
+        # Rows were bulk-loaded behind save_estimate's back; derive the rollups from them
+        rollups.rebuild()
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        db.engine.dispose()
+    os.replace(partial, path)
+    print(f'generated {path} in {time.perf_counter() - started:.1f}s')
+    return path
+
+
+def add_arguments(parser):
+    parser.add_argument('--services', type=int, default=DEFAULT_SERVICES)
+    parser.add_argument('--estimates', type=int, default=DEFAULT_ESTIMATES)
+    parser.add_argument('--users', type=int, default=DEFAULT_USERS)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+    from app import create_app
+    print(ensure_dataset(create_app, args.services, args.estimates, args.users, args.seed, args.data_dir))
+
+
+if __name__ == '__main__':
+    main()
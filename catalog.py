@@ -0,0 +1,195 @@
+"""In-process tariff snapshot.
+
+The tariff (services, service/patient categories and the discount matrix) is
+read on every estimate but only changes through a handful of admin/manager
+endpoints. Those endpoints call ``bump_version()`` after committing; readers
+call ``get_tariff()`` which returns an immutable snapshot and only goes back to
+the database when the version has moved on.
+
+The version is a counter row in the ``sequence`` table, so a write handled by
+one worker process reaches all of them. Each process re-reads it at most every
+CATALOG_VERSION_TTL seconds (one small query); other workers therefore see a
+catalog edit within that interval, the worker that made it immediately.
+
+Read-only catalog listings are additionally cached as serialized response
+bodies with a content hash for use as an ETag (see ``cached_body()``).
+"""
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Service, ServiceCategory, PatientCategory, Discount, Sequence
+import metrics
+
+ServiceEntry = namedtuple('ServiceEntry', [
+    'id', 'name', 'category_id', 'cost_price', 'mrp', 'is_daily_charge', 'visits_per_day'
+])
+CategoryEntry = namedtuple('CategoryEntry', ['id', 'name', 'display_name'])
+DiscountEntry = namedtuple('DiscountEntry', [
+    'id', 'patient_category_id', 'service_category_id', 'discount_type', 'discount_value'
+])
+
+TariffSnapshot = namedtuple('TariffSnapshot', [
+    'version',
+    'services',             # service id -> ServiceEntry
+    'service_categories',   # service category id -> CategoryEntry
+    'patient_categories',   # patient category name -> CategoryEntry
+    'discounts',            # (patient category id, service category id) -> DiscountEntry
+])
+
+VERSION_SEQUENCE = 'catalog_version'
+DEFAULT_VERSION_TTL = 2.0
+
+_version_lock = threading.Lock()
+_build_lock = threading.Lock()
+_generation = 0      # bumped by reset(): forces a re-read, e.g. after switching databases
+_shared_version = 0  # last value read from the sequence row
+_checked_at = None   # time.monotonic() of that read
+_snapshot = None
+_bodies = {}  # cache key -> (tariff version, body bytes, etag)
+
+
+def _read_shared_version():
+    return db.session.execute(
+        select(Sequence.next_value).where(Sequence.name == VERSION_SEQUENCE)
+    ).scalar() or 0
+
+
+def catalog_version():
+    """The current catalog version, re-read from the database once CATALOG_VERSION_TTL has passed."""
+    global _shared_version, _checked_at
+    now = time.monotonic()
+    checked_at = _checked_at
+    if checked_at is None or now - checked_at >= current_app.config.get('CATALOG_VERSION_TTL', DEFAULT_VERSION_TTL):
+        with metrics.cache_refill():
+            _shared_version = _read_shared_version()
+        _checked_at = now
+    return (_generation, _shared_version)
+
+
+def bump_version():
+    """Mark the catalog changed in every process. Call after committing a catalog write."""
+    global _shared_version, _checked_at
+    table = Sequence.__table__
+    while True:
+        with db.engine.begin() as conn:
+            bumped = conn.execute(
+                update(table)
+                .where(table.c.name == VERSION_SEQUENCE)
+                .values(next_value=table.c.next_value + 1)
+            )
+            if bumped.rowcount:
+                value = conn.execute(
+                    select(table.c.next_value).where(table.c.name == VERSION_SEQUENCE)).scalar_one()
+                break
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.insert().values(name=VERSION_SEQUENCE, next_value=0))
+        except IntegrityError:
+            pass  # another process created it first; retry the update
+    with _version_lock:
+        _shared_version = max(_shared_version, value)
+        _checked_at = time.monotonic()
+
+
+def reset():
+    """Drop this process's view of the version, e.g. when the app switches to another database."""
+    global _generation, _checked_at
+    with _version_lock:
+        _generation += 1
+        _checked_at = None
+
+
+def get_tariff():
+    """Return the current TariffSnapshot, rebuilding it if the catalog changed."""
+    global _snapshot
+    # Read the version before querying so a write that lands mid-build
+    # leaves the new snapshot stale rather than silently current.
+    version = catalog_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        metrics.cache_hit('tariff')
+        return snapshot
+
+    with _build_lock:
+        if _snapshot is None or _snapshot.version != version:
+            metrics.cache_miss('tariff')
+            with metrics.cache_refill():
+                _snapshot = _build_snapshot(version)
+        else:
+            metrics.cache_hit('tariff')
+        return _snapshot
+
+
+def cached_body(key, serialize):
+    """Return ``(body, etag)`` for a catalog listing.
+
+    ``serialize(tariff)`` must return the response body as bytes; it is only
+    called when the tariff has changed since the body was last built.
+    """
+    tariff = get_tariff()
+    entry = _bodies.get(key)
+    if entry is None or entry[0] != tariff.version:
+        metrics.cache_miss('catalog_body')
+        body = serialize(tariff)
+        entry = (tariff.version, body, hashlib.sha1(body).hexdigest())
+        _bodies[key] = entry
+    else:
+        metrics.cache_hit('catalog_body')
+    return entry[1], entry[2]
+
+
+def _build_snapshot(version):
+    services = {
+        row.id: ServiceEntry(
+            id=row.id,
+            name=row.name,
+            category_id=row.category_id,
+            cost_price=float(row.cost_price),
+            mrp=float(row.mrp),
+            is_daily_charge=bool(row.is_daily_charge),
+            visits_per_day=row.visits_per_day
+        )
+        for row in db.session.query(
+            Service.id, Service.name, Service.category_id, Service.cost_price,
+            Service.mrp, Service.is_daily_charge, Service.visits_per_day
+        ).order_by(Service.id)
+    }
+    service_categories = {
+        row.id: CategoryEntry(row.id, row.name, row.display_name)
+        for row in db.session.query(
+            ServiceCategory.id, ServiceCategory.name, ServiceCategory.display_name
+        ).order_by(ServiceCategory.id)
+    }
+    patient_categories = {
+        row.name: CategoryEntry(row.id, row.name, row.display_name)
+        for row in db.session.query(
+            PatientCategory.id, PatientCategory.name, PatientCategory.display_name
+        ).order_by(PatientCategory.id)
+    }
+    discounts = {
+        (row.patient_category_id, row.service_category_id): DiscountEntry(
+            id=row.id,
+            patient_category_id=row.patient_category_id,
+            service_category_id=row.service_category_id,
+            discount_type=row.discount_type,
+            discount_value=float(row.discount_value)
+        )
+        for row in db.session.query(
+            Discount.id, Discount.patient_category_id, Discount.service_category_id,
+            Discount.discount_type, Discount.discount_value
+        ).order_by(Discount.id)
+    }
+    return TariffSnapshot(
+        version=version,
+        services=MappingProxyType(services),
+        service_categories=MappingProxyType(service_categories),
+        patient_categories=MappingProxyType(patient_categories),
+        discounts=MappingProxyType(discounts)
+    )
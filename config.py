@@ -0,0 +1,84 @@
+"""Configuration profiles.
+
+``create_app`` loads one of PROFILES, chosen by the APP_PROFILE environment
+variable (default ``development``). DATABASE_URL, when set, replaces the
+bundled SQLite file so a server database can be used without code changes.
+"""
+import os
+
+
+def _env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def database_url(default='sqlite:///hospital_estimate.db'):
+    url = os.environ.get('DATABASE_URL', default)
+    # Some hosts still hand out the pre-SQLAlchemy-1.4 scheme
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+class Config:
+    DEBUG = False
+    SECRET_KEY = os.environ.get('FLASK_SECRET', 'dev-secret-change-me')
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    # PRAGMA name -> value, applied to every new SQLite connection (see sqlite_tuning)
+    SQLITE_PRAGMAS = {}
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    QUERY_BUDGET_STRICT = _env_flag('QUERY_BUDGET_STRICT')
+    # /metrics needs "Authorization: Bearer <METRICS_TOKEN>" unless METRICS_PUBLIC is set
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_PUBLIC = _env_flag('METRICS_PUBLIC')
+    # Seconds between checks of the shared catalog version (see catalog.py)
+    CATALOG_VERSION_TTL = float(os.environ.get('CATALOG_VERSION_TTL', 2))
+    # werkzeug method string; existing hashes are upgraded on login when it changes
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    # Estimates fetched (with their lines) per round trip by the streaming export
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 1000))
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+
+
+class ProductionConfig(Config):
+    # No fallback: create_app refuses to start without FLASK_SECRET
+    SECRET_KEY = os.environ.get('FLASK_SECRET')
+    # WAL lets readers run alongside the single writer; NORMAL sync is durable
+    # across application crashes in WAL mode. Writers wait up to busy_timeout
+    # for the lock instead of failing with "database is locked".
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'busy_timeout': 5000,
+        'synchronous': 'NORMAL',
+        'mmap_size': 268435456,   # 256 MiB
+        'cache_size': -65536,     # 64 MiB, in KiB when negative
+        'temp_store': 'MEMORY',
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': 30,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+    }
+
+
+PROFILES = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
+
+
+def get_profile(name=None):
+    name = name or os.environ.get('APP_PROFILE', 'development')
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown APP_PROFILE '{name}'; expected one of {', '.join(PROFILES)}")
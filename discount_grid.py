@@ -0,0 +1,128 @@
+"""Whole-matrix access to discounts.
+
+Discounts form a dense patient category x service category grid. Reads come
+straight from the tariff snapshot; writes are diffed against the current rows
+and applied as at most one INSERT, one UPDATE and one DELETE statement
+(each executemany) inside the caller's transaction.
+"""
+from sqlalchemy import bindparam
+
+from models import db, Discount
+
+DISCOUNT_TYPES = ('percentage', 'flat', 'fixed')
+
+
+def read_grid(tariff):
+    """Return the discount matrix as a compact, name-indexed payload.
+
+    ``cells[i][j]`` is ``[discount_type, discount_value]`` for
+    ``patient_categories[i]`` x ``service_categories[j]``, or null.
+    """
+    patient_categories = list(tariff.patient_categories.values())
+    service_categories = list(tariff.service_categories.values())
+    cells = []
+    for patient_cat in patient_categories:
+        row = []
+        for service_cat in service_categories:
+            discount = tariff.discounts.get((patient_cat.id, service_cat.id))
+            row.append([discount.discount_type, discount.discount_value] if discount else None)
+        cells.append(row)
+    return {
+        'patient_categories': [c.name for c in patient_categories],
+        'service_categories': [c.name for c in service_categories],
+        'cells': cells
+    }
+
+
+def parse_grid(tariff, cells):
+    """Turn a ``{patient_category: {service_category: cell}}`` mapping into changes.
+
+    A cell is ``{"discount_type": ..., "discount_value": ...}``, or null to remove
+    the discount. Returns ``(changes, errors)`` where ``changes`` maps
+    ``(patient_category_id, service_category_id)`` to ``(type, value)`` or None.
+    """
+    service_ids = {c.name: c.id for c in tariff.service_categories.values()}
+    changes = {}
+    errors = []
+    if not isinstance(cells, dict):
+        return changes, ['cells must be an object keyed by patient category']
+
+    for patient_name, row in cells.items():
+        patient_cat = tariff.patient_categories.get(patient_name)
+        if patient_cat is None:
+            errors.append(f"Invalid patient category '{patient_name}'")
+            continue
+        if not isinstance(row, dict):
+            errors.append(f"{patient_name}: expected an object keyed by service category")
+            continue
+        for service_name, cell in row.items():
+            if service_name not in service_ids:
+                errors.append(f"{patient_name}: invalid service category '{service_name}'")
+                continue
+            key = (patient_cat.id, service_ids[service_name])
+            if cell is None:
+                changes[key] = None
+                continue
+            try:
+                discount_type = str(cell.get('discount_type', '')).strip().lower()
+                discount_value = float(cell.get('discount_value'))
+            except (AttributeError, TypeError, ValueError):
+                errors.append(f"{patient_name}/{service_name}: invalid discount")
+                continue
+            if discount_type not in DISCOUNT_TYPES:
+                errors.append(f"{patient_name}/{service_name}: discount_type must be one of {', '.join(DISCOUNT_TYPES)}")
+            elif discount_value < 0:
+                errors.append(f"{patient_name}/{service_name}: discount value cannot be negative")
+            else:
+                changes[key] = (discount_type, discount_value)
+    return changes, errors
+
+
+def apply_changes(changes, replace=False):
+    """Upsert/delete discounts in the current transaction.
+
+    ``changes`` maps ``(patient_category_id, service_category_id)`` to
+    ``(discount_type, discount_value)``, or None to delete. With ``replace``,
+    every existing discount not present in ``changes`` is deleted as well.
+    Returns counts of created, updated and deleted rows; the caller commits.
+    """
+    table = Discount.__table__
+    current = {
+        (row.patient_category_id, row.service_category_id): row
+        for row in db.session.query(
+            Discount.id, Discount.patient_category_id, Discount.service_category_id,
+            Discount.discount_type, Discount.discount_value
+        )
+    }
+
+    inserts, updates, deletes = [], [], []
+    for key, change in changes.items():
+        existing = current.get(key)
+        if change is None:
+            if existing is not None:
+                deletes.append(existing.id)
+        elif existing is None:
+            inserts.append({
+                'patient_category_id': key[0],
+                'service_category_id': key[1],
+                'discount_type': change[0],
+                'discount_value': change[1]
+            })
+        elif (existing.discount_type, float(existing.discount_value)) != change:
+            updates.append({'_id': existing.id, '_type': change[0], '_value': change[1]})
+    if replace:
+        deletes.extend(row.id for key, row in current.items() if key not in changes)
+
+    if inserts:
+        db.session.execute(table.insert(), inserts)
+    if updates:
+        db.session.execute(
+            table.update()
+            .where(table.c.id == bindparam('_id'))
+            .values(discount_type=bindparam('_type'), discount_value=bindparam('_value')),
+            updates
+        )
+    if deletes:
+        db.session.execute(table.delete().where(table.c.id.in_(deletes)))
+
+    return {'created': len(inserts), 'updated': len(updates), 'deleted': len(deletes)}
@@ -0,0 +1,198 @@
+"""Server-side estimate drafts with incremental repricing.
+
+While an estimate is being put together, the browser sends each change
+(services added or removed, a new length of stay or patient category)
+instead of re-posting the whole selection. A draft keeps one row per priced
+line with the line's unrounded amounts, and ``apply_changes`` reprices and
+rewrites only the lines a change can affect:
+
+- added services;
+- daily-charge lines, when the length of stay changes;
+- lines whose discount differs between the old and the new patient category.
+
+Totals are summed from the stored amounts in service id order, the order and
+precision ``pricing.price_estimates`` uses. A draft's summary is therefore
+exactly what a full computation of the same selection gives, and the draft
+can be saved without pricing it again. Like a generated estimate held by the
+browser, a draft keeps the prices it was computed with; ``reprice``
+recomputes every line against the current catalog. Drafts untouched for
+DRAFT_TTL seconds are deleted whenever a new draft is created.
+"""
+import json
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, select
+
+from models import db, EstimateDraft, EstimateDraftLine
+from pricing import price_lines, summarize
+
+DEFAULT_TTL = 24 * 3600
+
+
+class DraftError(ValueError):
+    """A change that cannot be applied; the message is meant for the user."""
+
+
+def _summary(line_totals, discounts):
+    # Left-to-right sums in service id order, as price_estimates accumulates them
+    return summarize(float(sum(line_totals)), float(sum(discounts)))
+
+
+def _insert_lines(draft_id, lines, discounts):
+    if lines:
+        db.session.execute(EstimateDraftLine.__table__.insert(), [{
+            'draft_id': draft_id,
+            'service_id': line['service_id'],
+            'line': json.dumps(line, separators=(',', ':')),
+            'line_total': line['line_total'],
+            'discount': discount
+        } for line, discount in zip(lines, discounts)])
+
+
+def _service_ids(values, field):
+    if values is None:
+        return set()
+    if not isinstance(values, list):
+        raise DraftError(f'{field} must be a list of service ids')
+    try:
+        return {int(value) for value in values}
+    except (TypeError, ValueError):
+        raise DraftError(f'{field} must be a list of service ids')
+
+
+def _discount_terms(tariff, patient_cat, service):
+    discount = tariff.discounts.get((patient_cat.id, service.category_id))
+    return None if discount is None else (discount.discount_type, discount.discount_value)
+
+
+def purge_expired():
+    ttl = current_app.config.get('DRAFT_TTL', DEFAULT_TTL)
+    expired = EstimateDraft.updated_at < datetime.utcnow() - timedelta(seconds=ttl)
+    db.session.execute(delete(EstimateDraftLine).where(
+        EstimateDraftLine.draft_id.in_(select(EstimateDraft.id).where(expired))))
+    db.session.execute(delete(EstimateDraft).where(expired))
+
+
+def create(tariff, user_id, patient_name, patient_uhid, patient_cat, length_of_stay, services):
+    """Add a draft priced for ``services``; the caller commits. Returns (draft, lines, summary)."""
+    purge_expired()
+    lines, discounts = price_lines(tariff, patient_cat, length_of_stay, services)
+    draft = EstimateDraft(
+        user_id=user_id,
+        patient_name=patient_name,
+        patient_uhid=patient_uhid,
+        patient_category=patient_cat.name,
+        length_of_stay=length_of_stay
+    )
+    db.session.add(draft)
+    db.session.flush()
+    _insert_lines(draft.id, lines, discounts)
+    return draft, lines, _summary([line['line_total'] for line in lines], discounts)
+
+
+def estimate(draft):
+    """(estimate_lines, summary) of a draft as it stands."""
+    rows = db.session.execute(
+        select(EstimateDraftLine.line, EstimateDraftLine.line_total, EstimateDraftLine.discount)
+        .where(EstimateDraftLine.draft_id == draft.id)
+        .order_by(EstimateDraftLine.service_id)
+    ).all()
+    return [json.loads(row.line) for row in rows], _summary([row.line_total for row in rows],
+                                                            [row.discount for row in rows])
+
+
+def discard(draft):
+    """Delete a draft and its lines; the caller commits."""
+    db.session.execute(delete(EstimateDraftLine).where(EstimateDraftLine.draft_id == draft.id))
+    db.session.delete(draft)
+
+
+def apply_changes(tariff, draft, changes):
+    """Apply one delta to a draft; the caller commits.
+
+    ``changes`` may hold ``add_services`` and ``remove_services`` (lists of
+    service ids; removals apply first), ``length_of_stay``,
+    ``patient_category``, ``patient_name``, ``patient_uhid`` and
+    ``reprice``. Returns (changed lines, removed service ids, summary).
+    Raises DraftError for invalid changes, leaving the draft untouched.
+    """
+    old_cat = tariff.patient_categories.get(draft.patient_category)
+    patient_cat = old_cat
+    if changes.get('patient_category'):
+        patient_cat = tariff.patient_categories.get(changes['patient_category'])
+        if patient_cat is None:
+            raise DraftError('Invalid patient category')
+    if patient_cat is None:
+        raise DraftError("The draft's patient category no longer exists; choose another")
+
+    length_of_stay = draft.length_of_stay
+    if changes.get('length_of_stay') is not None:
+        try:
+            length_of_stay = int(changes['length_of_stay'])
+        except (TypeError, ValueError):
+            raise DraftError('length_of_stay must be a whole number of days')
+        if length_of_stay < 1:
+            raise DraftError('Length of stay must be at least 1 day')
+
+    if 'patient_name' in changes and not changes['patient_name']:
+        raise DraftError('patient_name cannot be empty')
+
+    remove = _service_ids(changes.get('remove_services'), 'remove_services')
+    add = _service_ids(changes.get('add_services'), 'add_services')
+    unknown = sorted(service_id for service_id in add if service_id not in tariff.services)
+    if unknown:
+        raise DraftError(f'Unknown service ids: {", ".join(map(str, unknown))}')
+
+    reprice_all = bool(changes.get('reprice'))
+    stay_changed = length_of_stay != draft.length_of_stay
+    category_changed = patient_cat is not old_cat
+
+    # Only the amounts are read; line contents are rewritten just for repriced lines
+    amounts = {}
+    removed = []
+    to_price = set()
+    for service_id, line_total, discount in db.session.execute(
+        select(EstimateDraftLine.service_id, EstimateDraftLine.line_total, EstimateDraftLine.discount)
+        .where(EstimateDraftLine.draft_id == draft.id)
+    ):
+        service = tariff.services.get(service_id)
+        if service_id in remove or (reprice_all and service is None):
+            # A full computation skips services no longer in the catalog too
+            removed.append(service_id)
+            continue
+        amounts[service_id] = (line_total, discount)
+        if service is None:
+            continue
+        if (reprice_all
+                or (stay_changed and service.is_daily_charge)
+                or (category_changed and old_cat is None)
+                or (category_changed and _discount_terms(tariff, old_cat, service)
+                    != _discount_terms(tariff, patient_cat, service))):
+            to_price.add(service_id)
+    to_price.update(add)
+
+    stale = removed + [service_id for service_id in to_price if service_id in amounts]
+    if stale:
+        db.session.execute(delete(EstimateDraftLine).where(
+            EstimateDraftLine.draft_id == draft.id, EstimateDraftLine.service_id.in_(stale)))
+    changed = []
+    if to_price:
+        changed, discounts = price_lines(
+            tariff, patient_cat, length_of_stay, [tariff.services[i] for i in sorted(to_price)])
+        _insert_lines(draft.id, changed, discounts)
+        for line, discount in zip(changed, discounts):
+            amounts[line['service_id']] = (line['line_total'], discount)
+    # A service removed and re-added in one change is not removed
+    removed = [service_id for service_id in removed if service_id not in amounts]
+
+    draft.patient_category = patient_cat.name
+    draft.length_of_stay = length_of_stay
+    if 'patient_name' in changes:
+        draft.patient_name = changes['patient_name']
+    if 'patient_uhid' in changes:
+        draft.patient_uhid = changes['patient_uhid']
+    draft.updated_at = datetime.utcnow()
+
+    order = sorted(amounts)
+    return changed, removed, _summary([amounts[i][0] for i in order], [amounts[i][1] for i in order])
@@ -0,0 +1,61 @@
+"""Compact storage format for SavedEstimate.estimate_data.
+
+New rows are stored as ``z1:`` followed by base64 of the zlib-compressed,
+compactly serialized estimate JSON. Rows without a recognised prefix are the
+original plain-JSON format and are returned unchanged, so old and new rows can
+coexist until ``compact_existing()`` has converted everything.
+"""
+import base64
+import json
+import zlib
+
+from sqlalchemy import bindparam, select
+
+from models import db, SavedEstimate
+
+FORMAT_PREFIX = 'z1:'
+
+
+def encode(estimate_data):
+    """Serialize an estimate dict into the stored representation."""
+    raw = json.dumps(estimate_data, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return FORMAT_PREFIX + base64.b64encode(zlib.compress(raw, 6)).decode('ascii')
+
+
+def decode(stored):
+    """Return the estimate JSON text for a stored value in any supported format."""
+    if stored and stored.startswith(FORMAT_PREFIX):
+        return zlib.decompress(base64.b64decode(stored[len(FORMAT_PREFIX):])).decode('utf-8')
+    return stored
+
+
+def compact_existing(batch_size=500):
+    """Rewrite plain-JSON estimate_data rows into the compact format.
+
+    Works in id-ordered batches, one transaction each; returns the number of
+    rows converted. Safe to re-run.
+    """
+    table = SavedEstimate.__table__
+    converted = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, table.c.estimate_data)
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return converted
+        last_id = rows[-1].id
+        updates = [
+            {'_id': row.id, '_data': encode(json.loads(row.estimate_data))}
+            for row in rows if not row.estimate_data.startswith(FORMAT_PREFIX)
+        ]
+        if updates:
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('_id')).values(estimate_data=bindparam('_data')),
+                updates
+            )
+            db.session.commit()
+            converted += len(updates)
@@ -0,0 +1,186 @@
+"""Bulk import of services and discounts from uploaded files.
+
+Service rows are read one at a time from the upload and written in fixed-size
+chunks with a single executemany INSERT per chunk, each chunk in its own
+transaction. Memory use stays flat regardless of file size and the SQLite
+write lock is only held for one chunk at a time. Chunks committed before a
+failure stay committed, so the failure is raised as ImportInterrupted
+carrying the counts of what was saved.
+
+Both importers are plain functions over an iterable of row dicts (see
+ingest.iter_upload_rows) so they can run inside a request or on the
+background job runner.
+"""
+from models import db, Service, ServiceCategory, PatientCategory
+import discount_grid
+
+SERVICE_COLUMNS = ['name', 'category_name', 'cost_price', 'mrp', 'is_daily_charge']
+DISCOUNT_COLUMNS = ['patient_category', 'service_category', 'discount_type', 'discount_value']
+CHUNK_SIZE = 1000
+# Bad rows beyond this are counted but not individually reported
+MAX_REPORTED_ERRORS = 1000
+
+
+class UploadError(Exception):
+    """The upload as a whole is unusable (empty file, missing columns, ...)."""
+
+
+class ImportInterrupted(Exception):
+    """The import failed after some chunks were committed.
+
+    ``result`` is the running summary at the time of the failure: the
+    committed ``success_count`` and ``chunks`` and the row errors so far.
+    """
+
+    def __init__(self, error, result):
+        super().__init__(f'{error} (stopped after {result["success_count"]} rows in '
+                         f'{result["chunks"]} chunks were saved; those rows were kept)')
+        self.result = result
+
+
+def import_services(rows, chunk_size=CHUNK_SIZE, on_progress=None):
+    """Insert services from an iterable of row dicts.
+
+    ``on_progress(processed_rows, result)`` is called after every committed
+    chunk with the running result. Returns the ``success_count``/``errors``
+    summary used by the bulk upload endpoint plus the number of chunks committed.
+    A failure after the first commit (an unreadable row further into the
+    file, a database error) rolls back the current chunk and is re-raised as
+    ImportInterrupted.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        raise UploadError('File is empty or has no data rows')
+
+    missing_columns = [col for col in SERVICE_COLUMNS if col not in first]
+    if missing_columns:
+        raise UploadError(f'Missing required columns: {", ".join(missing_columns)}')
+
+    category_map = dict(db.session.query(ServiceCategory.name, ServiceCategory.id))
+    insert = Service.__table__.insert()
+    result = {'success_count': 0, 'errors': [], 'chunks': 0}
+    error_count = 0
+    chunk = []
+
+    def flush(processed):
+        db.session.execute(insert, chunk)
+        db.session.commit()
+        result['success_count'] += len(chunk)
+        result['chunks'] += 1
+        chunk.clear()
+        if on_progress:
+            on_progress(processed, result)
+
+    row_num = 1
+    try:
+        for row_num, row in enumerate(_prepend(first, rows), start=2):
+            try:
+                chunk.append(_service_values(row, category_map))
+            except (TypeError, ValueError) as e:
+                error_count += 1
+                if error_count <= MAX_REPORTED_ERRORS:
+                    result['errors'].append(f"Row {row_num}: {str(e)}")
+                continue
+            if len(chunk) >= chunk_size:
+                flush(row_num - 1)
+
+        if chunk:
+            flush(row_num - 1)
+    except Exception as e:
+        db.session.rollback()
+        if not result['chunks']:
+            raise
+        raise ImportInterrupted(e, result) from e
+    if error_count > MAX_REPORTED_ERRORS:
+        result['errors'].append(f"... and {error_count - MAX_REPORTED_ERRORS} more rows with errors")
+    if on_progress:
+        on_progress(row_num - 1, result)
+    return result
+
+
+def import_discounts(rows, on_progress=None):
+    """Upsert discounts from an iterable of row dicts in one transaction.
+
+    Rows are validated as they are read; the valid ones are applied together
+    through discount_grid.apply_changes. Returns ``success_count``/``errors``.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        raise UploadError('File is empty')
+
+    missing_columns = [col for col in DISCOUNT_COLUMNS if col not in first]
+    if missing_columns:
+        raise UploadError(f'Missing required columns: {", ".join(missing_columns)}')
+
+    # Get existing categories for validation
+    service_categories = dict(db.session.query(ServiceCategory.name, ServiceCategory.id))
+    patient_categories = dict(db.session.query(PatientCategory.name, PatientCategory.id))
+
+    result = {'success_count': 0, 'errors': []}
+    errors = result['errors']
+    changes = {}
+    row_num = 1
+    for row_num, row in enumerate(_prepend(first, rows), start=2):
+        patient_category = str(row.get('patient_category', '')).strip()
+        service_category = str(row.get('service_category', '')).strip()
+        discount_type = str(row.get('discount_type', '')).strip().lower()
+        discount_value = row.get('discount_value', 0)
+
+        if patient_category not in patient_categories:
+            errors.append(f"Row {row_num}: Invalid patient category '{patient_category}'. Valid options: {list(patient_categories.keys())}")
+            continue
+
+        if service_category not in service_categories:
+            errors.append(f"Row {row_num}: Invalid service category '{service_category}'. Valid options: {list(service_categories.keys())}")
+            continue
+
+        if discount_type not in ['percentage', 'fixed']:
+            errors.append(f"Row {row_num}: Discount type must be 'percentage' or 'fixed'")
+            continue
+
+        try:
+            discount_value = float(discount_value)
+        except (ValueError, TypeError):
+            errors.append(f"Row {row_num}: Invalid discount value")
+            continue
+        if discount_value < 0:
+            errors.append(f"Row {row_num}: Discount value cannot be negative")
+            continue
+
+        # Later rows for the same pair win, as with row-by-row upserts
+        changes[(patient_categories[patient_category], service_categories[service_category])] = (
+            discount_type, discount_value
+        )
+        result['success_count'] += 1
+
+    if changes:
+        discount_grid.apply_changes(changes)
+        db.session.commit()
+    if on_progress:
+        on_progress(row_num - 1, result)
+    return result
+
+
+def _prepend(first, rows):
+    yield first
+    yield from rows
+
+
+def _service_values(row, category_map):
+    name = str(row.get('name', '')).strip()
+    category_name = str(row.get('category_name', '')).strip()
+
+    if not name or not category_name or category_name not in category_map:
+        raise ValueError(f"Invalid name or category '{category_name}'")
+
+    return {
+        'name': name,
+        'category_id': category_map[category_name],
+        'cost_price': float(row.get('cost_price', 0)),
+        'mrp': float(row.get('mrp', 0)),
+        # Convert boolean values
+        'is_daily_charge': str(row.get('is_daily_charge', '')).lower() in ['1', 'true', 'yes', '1.0'],
+        'visits_per_day': int(float(row.get('visits_per_day', 1)))
+    }
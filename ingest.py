@@ -0,0 +1,67 @@
+"""Row-at-a-time readers for uploaded CSV and Excel files.
+
+Every reader yields one ``{column: value}`` dict per data row, keyed by the
+header row, without loading the whole sheet. Blank cells come through as
+empty strings, as they would from a CSV, so the importers validate every
+format the same way; fully blank rows are skipped.
+
+The Excel libraries are imported only when an Excel upload arrives:
+openpyxl (read-only mode) for .xlsx and xlrd for legacy .xls files.
+"""
+import csv
+import io
+
+
+def iter_upload_rows(file, file_extension):
+    """Yield the rows of an uploaded file (a werkzeug FileStorage) as dicts."""
+    if file_extension == '.csv':
+        return _iter_csv(file.stream)
+    if file_extension == '.xls':
+        return _iter_xls(file.stream)
+    return _iter_xlsx(file.stream)
+
+
+def _iter_csv(stream):
+    yield from csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+
+
+def _rows_to_dicts(rows):
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [str(name) if name not in (None, '') else f'Unnamed: {i}' for i, name in enumerate(header)]
+    for values in rows:
+        values = ['' if value is None else value for value in values]
+        if not any(value != '' for value in values):
+            continue
+        yield dict(zip(columns, values))
+
+
+def _iter_xlsx(stream):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        yield from _rows_to_dicts(sheet.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def _iter_xls(stream):
+    import xlrd
+
+    workbook = xlrd.open_workbook(file_contents=stream.read(), on_demand=True)
+    try:
+        sheet = workbook.sheet_by_index(0)
+
+        def value(cell):
+            if cell.ctype == xlrd.XL_CELL_BOOLEAN:
+                return bool(cell.value)
+            if cell.ctype == xlrd.XL_CELL_NUMBER and cell.value == int(cell.value):
+                return int(cell.value)
+            return cell.value
+
+        yield from _rows_to_dicts([value(cell) for cell in sheet.row(i)] for i in range(sheet.nrows))
+    finally:
+        workbook.release_resources()
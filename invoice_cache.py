@@ -0,0 +1,125 @@
+"""On-disk cache of rendered estimate invoices.
+
+Each rendering is stored as one file named after the estimate id, the variant
+(``html`` or ``print``) and a hash of the stored ``estimate_data``, so an
+entry can only ever match the data it was rendered from. Repeat views and
+reprints are read straight from disk instead of decoding the estimate and
+rendering the template again.
+
+The directory (INVOICE_CACHE_DIR, default ``<instance>/invoice-cache``) is
+kept under INVOICE_CACHE_MAX_BYTES by evicting the least recently used
+files. Recency is the file mtime, touched on every hit, so the order survives
+restarts; each worker process tracks the total size itself, so with several
+workers the directory can briefly run over the limit until the next eviction.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+
+import metrics
+
+# Part of every key: bump when the invoice template changes so old renderings are never served
+RENDER_VERSION = 1
+
+
+def data_digest(stored_estimate_data):
+    """Hash of a SavedEstimate.estimate_data value, as stored."""
+    text = '%s:%s' % (RENDER_VERSION, stored_estimate_data or '')
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+class InvoiceCache:
+    def __init__(self, app=None):
+        self._entries = None  # file name -> size, least recently used first
+        self._total = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config.get('INVOICE_CACHE_DIR') or os.path.join(app.instance_path, 'invoice-cache')
+        self.max_bytes = int(app.config.get('INVOICE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        app.extensions['invoice_cache'] = self
+
+    def _load(self):
+        # Index the directory on first use, oldest first
+        if self._entries is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.html') and entry.is_file():
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        found.sort()
+        self._entries = OrderedDict((name, size) for _, name, size in found)
+        self._total = sum(self._entries.values())
+
+    def _remove(self, name):
+        self._total -= self._entries.pop(name)
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def get(self, name):
+        with self._lock:
+            self._load()
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another worker
+            with self._lock:
+                if name in self._entries:
+                    self._total -= self._entries.pop(name)
+            return None
+        return body
+
+    def put(self, name, body, stale_prefix):
+        """Store ``body`` under ``name``, dropping other files starting with ``stale_prefix``."""
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            self._load()
+            temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temporary, 'wb') as f:
+                f.write(body)
+            os.replace(temporary, path)
+            if name in self._entries:
+                self._total -= self._entries.pop(name)
+            for stale in [n for n in self._entries if n.startswith(stale_prefix)]:
+                self._remove(stale)
+            self._entries[name] = len(body)
+            self._total += len(body)
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._load()
+            for name in list(self._entries):
+                self._remove(name)
+
+
+def cached_invoice(estimate_id, variant, stored_estimate_data, render):
+    """Return (html bytes, etag) for an estimate, calling ``render()`` only on a cache miss."""
+    cache = current_app.extensions['invoice_cache']
+    digest = data_digest(stored_estimate_data)
+    prefix = f'{estimate_id}-{variant}-'
+    name = f'{prefix}{digest}.html'
+    body = cache.get(name)
+    if body is not None:
+        metrics.cache_hit('invoice')
+        return body, digest
+    metrics.cache_miss('invoice')
+    body = render().encode('utf-8')
+    cache.put(name, body, prefix)
+    return body, digest
@@ -0,0 +1,135 @@
+"""Local background job runner.
+
+Long-running work (bulk uploads) is handed to a small thread pool inside the
+worker process so the request can return immediately with a job id. Each job's
+status, progress and result are written to the ``background_job`` table as it
+runs, so ``/api/jobs/<id>`` can be answered by any worker process, not only the
+one running the job. There is no external broker: a job whose process stops
+before it finishes is left in its last recorded state.
+"""
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import delete, select, update
+
+from models import db, BackgroundJob
+import applog
+
+# Finished jobs kept for polling before the oldest are forgotten
+MAX_FINISHED_JOBS = 200
+
+
+class Job:
+    def __init__(self, kind, user_id, id=None):
+        self.id = id or uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.status = 'queued'  # queued -> running -> completed | failed
+        self.progress = {}
+        self.errors = []
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls(row.kind, row.user_id, id=row.id)
+        job.status = row.status
+        job.progress = json.loads(row.progress)
+        job.errors = json.loads(row.errors)
+        job.result = json.loads(row.result) if row.result is not None else None
+        job.error = row.error
+        job.created_at = row.created_at
+        job.finished_at = row.finished_at
+        return job
+
+    def report(self, processed_rows, result):
+        """Progress callback for the importers; called between their commits."""
+        self.progress = {'processed_rows': processed_rows, 'success_count': result['success_count']}
+        self.errors = list(result['errors'])
+        self._save(progress=json.dumps(self.progress), errors=json.dumps(self.errors))
+
+    def _save(self, **values):
+        db.session.execute(update(BackgroundJob).where(BackgroundJob.id == self.id).values(**values))
+        db.session.commit()
+
+    @property
+    def finished(self):
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'errors': list(self.errors),
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None
+        }
+
+
+class JobRunner:
+    def __init__(self, app=None):
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self._executor = ThreadPoolExecutor(
+            max_workers=app.config.get('JOB_WORKERS', 2),
+            thread_name_prefix='job'
+        )
+        app.extensions['jobs'] = self
+
+    def submit(self, kind, user_id, func, *args):
+        """Record a job and queue ``func(job, *args)`` to run inside an app context; returns the Job.
+
+        Commits the current session. ``func`` may call ``job.report`` as it goes
+        and returns the final result, which must be JSON serializable.
+        """
+        job = Job(kind, user_id)
+        self._prune()
+        db.session.add(BackgroundJob(id=job.id, kind=kind, user_id=user_id, status=job.status,
+                                     created_at=job.created_at))
+        db.session.commit()
+        self._executor.submit(self._run, job, func, args)
+        return job
+
+    def get(self, job_id):
+        row = db.session.get(BackgroundJob, job_id)
+        return Job.from_row(row) if row is not None else None
+
+    def _run(self, job, func, args):
+        with self.app.app_context():
+            job.status = 'running'
+            job._save(status=job.status)
+            try:
+                job.result = func(job, *args)
+                job.status = 'completed'
+            except Exception as e:
+                applog.exception('background job failed', job_id=job.id, kind=job.kind)
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.finished_at = datetime.utcnow()
+            db.session.rollback()
+            try:
+                job._save(status=job.status, progress=json.dumps(job.progress), errors=json.dumps(job.errors),
+                          result=json.dumps(job.result) if job.result is not None else None,
+                          error=job.error, finished_at=job.finished_at)
+            except Exception:
+                db.session.rollback()
+                applog.exception('could not record background job result', job_id=job.id, kind=job.kind)
+
+    def _prune(self):
+        keep = (select(BackgroundJob.id).where(BackgroundJob.finished_at.is_not(None))
+                .order_by(BackgroundJob.finished_at.desc()).limit(MAX_FINISHED_JOBS))
+        db.session.execute(delete(BackgroundJob).where(
+            BackgroundJob.finished_at.is_not(None), BackgroundJob.id.not_in(keep)))
@@ -0,0 +1,190 @@
+"""Request, SQL and cache metrics in Prometheus text format.
+
+Every request served by the instrumented blueprint records its latency and
+status, plus how many SQL statements it issued and how long they took
+(counted through SQLAlchemy engine events). In-process caches report hits and
+misses through ``cache_hit``/``cache_miss``. ``/metrics`` renders everything
+for a scraper. It answers only requests carrying ``Authorization: Bearer
+<METRICS_TOKEN>``, or anyone when METRICS_PUBLIC is set (for deployments that
+restrict the path elsewhere); otherwise it is a 404. The client address is
+not used, since behind a local reverse proxy every request looks local.
+"""
+import hmac
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import Response, abort, g, has_app_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_lock = threading.Lock()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+_latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))      # (endpoint, method)
+_statements = defaultdict(lambda: Histogram(STATEMENT_BUCKETS))  # (endpoint,)
+_sql_seconds = defaultdict(float)                                # (endpoint,)
+_responses = defaultdict(int)                                    # (endpoint, method, status)
+_cache = defaultdict(int)                                        # (cache, 'hit' | 'miss')
+_instrumented = set()                                            # blueprint names
+
+
+def cache_hit(name):
+    with _lock:
+        _cache[(name, 'hit')] += 1
+
+
+def cache_miss(name):
+    with _lock:
+        _cache[(name, 'miss')] += 1
+
+
+def request_sql_stats():
+    """(statement count, SQL seconds) for the current request so far."""
+    return g.get('sql_statements', 0), g.get('sql_seconds', 0.0)
+
+
+def request_refill_statements():
+    """How many of the current request's statements ran inside ``cache_refill()``."""
+    return g.get('sql_refill_statements', 0)
+
+
+@contextmanager
+def cache_refill():
+    """Mark the statements run inside as refilling a shared in-process cache.
+
+    They still count towards the request's statements; query budgets leave them
+    out, since whichever request happens to find a cache stale pays for them.
+    """
+    if not (has_app_context() and 'request_started' in g):
+        yield
+        return
+    g.sql_refill_depth = g.get('sql_refill_depth', 0) + 1
+    try:
+        yield
+    finally:
+        g.sql_refill_depth -= 1
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and 'request_started' in g:
+        g.sql_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and 'sql_started' in g:
+        g.sql_statements += 1
+        g.sql_seconds += time.perf_counter() - g.pop('sql_started')
+        if g.get('sql_refill_depth'):
+            g.sql_refill_statements += 1
+
+
+def _start_request():
+    if request.blueprint in _instrumented:
+        g.request_started = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+        g.sql_refill_statements = 0
+
+
+def _finish_request(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or 'unknown'
+    with _lock:
+        _latency[(endpoint, request.method)].observe(elapsed)
+        _responses[(endpoint, request.method, str(response.status_code))] += 1
+        _statements[(endpoint,)].observe(g.sql_statements)
+        _sql_seconds[(endpoint,)] += g.sql_seconds
+    return response
+
+
+def _escape(value):
+    # Label values escape backslash, double quote and newline in the text format
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _authorized(app):
+    if app.config.get('METRICS_PUBLIC'):
+        return True
+    token = app.config.get('METRICS_TOKEN')
+    if not token:
+        return False
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip().encode(), token.encode())
+
+
+def _render_histogram(lines, name, help_text, series, label_names):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key, hist in sorted(series.items()):
+        for bound, count in zip(hist.buckets, hist.counts):
+            lines.append(f'{name}_bucket{_labels(label_names, key, le=bound)} {count}')
+        lines.append(f'{name}_bucket{_labels(label_names, key, le="+Inf")} {hist.count}')
+        lines.append(f'{name}_sum{_labels(label_names, key)} {hist.sum}')
+        lines.append(f'{name}_count{_labels(label_names, key)} {hist.count}')
+
+
+def _render_counter(lines, name, help_text, series, label_names):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for key, value in sorted(series.items()):
+        lines.append(f'{name}{_labels(label_names, key)} {value}')
+
+
+def render():
+    lines = []
+    with _lock:
+        _render_histogram(lines, 'http_request_duration_seconds', 'Request latency by endpoint.',
+                          _latency, ('endpoint', 'method'))
+        _render_counter(lines, 'http_responses_total', 'Responses by endpoint and status code.',
+                        _responses, ('endpoint', 'method', 'status'))
+        _render_histogram(lines, 'db_statements_per_request', 'SQL statements issued per request.',
+                          _statements, ('endpoint',))
+        _render_counter(lines, 'db_statement_seconds_total', 'Time spent executing SQL per endpoint.',
+                        _sql_seconds, ('endpoint',))
+        _render_counter(lines, 'cache_requests_total', 'In-process cache lookups by result.',
+                        _cache, ('cache', 'result'))
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app, blueprint, db):
+    """Instrument ``blueprint``'s routes, hook SQL events and add ``/metrics``."""
+    _instrumented.add(blueprint.name)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def metrics_endpoint():
+        if not _authorized(app):
+            abort(404)
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
@@ -0,0 +1,117 @@
+"""Versioned schema migrations.
+
+``db.create_all()`` creates missing tables but never changes existing ones, so
+an existing hospital_estimate.db would never pick up new indexes or data
+format changes. Each entry in MIGRATIONS is applied once, in order, and
+recorded in the ``schema_migrations`` table; ``upgrade()`` runs at startup
+and through ``flask migrate``.
+
+Default data is seeded by a migration step too, so on an up-to-date database
+startup costs a single query. That fast path skips ``create_all``: new tables
+need their own step (``_create_tables``).
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, String, select
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateIndex
+
+from models import db, User, Service, SavedEstimate, SavedEstimateService, EstimateDraft, EstimateDraftLine, \
+    BackgroundJob, PatientCategoryDailyRollup, UserDailyRollup, ServiceCategoryDailyRollup
+import estimate_storage
+import rollups
+import seed
+
+schema_migrations = db.Table(
+    'schema_migrations',
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def _create_declared_indexes(*models):
+    """Create the indexes declared on the given models if they do not exist yet."""
+    for model in models:
+        for index in model.__table__.indexes:
+            db.session.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _create_tables(*models):
+    for model in models:
+        model.__table__.create(db.session.connection(), checkfirst=True)
+
+
+def _add_hot_path_indexes():
+    _create_declared_indexes(User, Service, SavedEstimate, SavedEstimateService)
+
+
+def _compact_estimate_storage():
+    estimate_storage.compact_existing()
+
+
+def _add_estimate_rollups():
+    _create_tables(PatientCategoryDailyRollup, UserDailyRollup, ServiceCategoryDailyRollup)
+    rollups.rebuild()
+
+
+def _add_estimate_drafts():
+    _create_tables(EstimateDraft, EstimateDraftLine)
+
+
+def _add_background_jobs():
+    _create_tables(BackgroundJob)
+
+
+def _rollups_by_local_day():
+    rollups.rebuild()
+
+
+# (version, name, callable). Append only; never renumber or edit an applied step.
+MIGRATIONS = [
+    (1, 'hot path indexes', _add_hot_path_indexes),
+    (2, 'compact saved estimate storage', _compact_estimate_storage),
+    (3, 'default categories and users', seed.seed_defaults),
+    (4, 'daily estimate rollups', _add_estimate_rollups),
+    (5, 'estimate drafts', _add_estimate_drafts),
+    (6, 'background jobs', _add_background_jobs),
+    (7, 'rollups by local day', _rollups_by_local_day),
+]
+
+
+def current_version():
+    return db.session.execute(select(db.func.max(schema_migrations.c.version))).scalar() or 0
+
+
+def _applied_versions():
+    try:
+        return set(db.session.execute(select(schema_migrations.c.version)).scalars())
+    except (OperationalError, ProgrammingError):
+        db.session.rollback()  # no schema_migrations table yet: a new database
+        return set()
+
+
+def upgrade():
+    """Create missing tables, then apply pending migrations. Returns the versions applied."""
+    applied = _applied_versions()
+    if applied.issuperset(version for version, _, _ in MIGRATIONS):
+        db.session.commit()
+        return []
+    db.create_all()
+    applied = _applied_versions()
+    newly_applied = []
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        migrate()
+        try:
+            db.session.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+            db.session.commit()
+        except IntegrityError:
+            # Another worker recorded it first; every step is idempotent
+            db.session.rollback()
+            continue
+        newly_applied.append(version)
+    return newly_applied
@@ -5,7 +5,16 @@ from datetime import datetime
 
 db = SQLAlchemy()
 
-class User(db.Model, UserMixin):
+class RoleMixin:
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+        
+    @property
+    def is_manager(self):
+        return self.role == 'manager'
+
+class User(db.Model, UserMixin, RoleMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(120), nullable=False)
@@ -14,13 +23,8 @@ class User(db.Model, UserMixin):
     rejected = db.Column(db.Boolean, default=False, nullable=False)  # Admin rejection status
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    @property
-    def is_admin(self):
-        return self.role == 'admin'
-        
-    @property
-    def is_manager(self):
-        return self.role == 'manager'
+    # Pending-approval listing: filter on status, ordered by signup time
+    __table_args__ = (db.Index('ix_user_status_created', 'approved', 'rejected', 'created_at'),)
 
     def set_password(self, password):
         self.password = generate_password_hash(password)
@@ -61,6 +65,9 @@ class Service(db.Model):
     visits_per_day = db.Column(db.Integer, default=1)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Category-filtered, id-keyset paginated service listing
+    __table_args__ = (db.Index('ix_service_category_id', 'category_id', 'id'),)
+
 class PatientCategory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
@@ -97,12 +104,19 @@ class SavedEstimate(db.Model):
     generated_by_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # JSON field to store complete estimate data
-    estimate_data = db.Column(db.Text, nullable=False)  # JSON string of full estimate
+    # Complete estimate data, in the format written by estimate_storage.encode.
+    # Deferred so listings never pull it in; decode with estimate_storage.decode.
+    estimate_data = db.deferred(db.Column(db.Text, nullable=False))
     
     # Relationships
     generated_by_user = db.relationship('User', backref='saved_estimates', lazy=True)
 
+    # Saved-estimate listings: per user or for everyone, newest first by (created_at, id)
+    __table_args__ = (
+        db.Index('ix_saved_estimate_user_created', 'generated_by_user_id', 'created_at', 'id'),
+        db.Index('ix_saved_estimate_created', 'created_at', 'id'),
+    )
+
 class SavedEstimateService(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     saved_estimate_id = db.Column(db.Integer, db.ForeignKey('saved_estimate.id'), nullable=False)
@@ -116,4 +130,82 @@ class SavedEstimateService(db.Model):
     
     # Relationships
     saved_estimate = db.relationship('SavedEstimate', backref='estimate_services', lazy=True)
-    service = db.relationship('Service', backref='saved_estimate_services', lazy=True)
\ No newline at end of file
+    service = db.relationship('Service', backref='saved_estimate_services', lazy=True)
+
+    __table_args__ = (db.Index('ix_saved_estimate_service_estimate', 'saved_estimate_id'),)
+
+class EstimateDraft(db.Model):
+    """An estimate being built up change by change; see drafts.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    patient_name = db.Column(db.String(200), nullable=False)
+    patient_uhid = db.Column(db.String(50), nullable=True)
+    patient_category = db.Column(db.String(50), nullable=False)
+    length_of_stay = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Expired drafts are purged by updated_at
+    __table_args__ = (db.Index('ix_estimate_draft_updated', 'updated_at'),)
+
+class EstimateDraftLine(db.Model):
+    """One priced line of an EstimateDraft"""
+    draft_id = db.Column(db.Integer, db.ForeignKey('estimate_draft.id'), primary_key=True)
+    service_id = db.Column(db.Integer, primary_key=True)
+    line = db.Column(db.Text, nullable=False)  # the estimate line dict, as JSON
+    # Unrounded amounts, summed into the draft's totals exactly as pricing does
+    line_total = db.Column(db.Float, nullable=False)
+    discount = db.Column(db.Float, nullable=False)
+
+class BackgroundJob(db.Model):
+    """Status of a jobs.JobRunner job, readable from every worker process"""
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    # JSON: progress dict, row errors so far, and the final result
+    progress = db.Column(db.Text, nullable=False, default='{}')
+    errors = db.Column(db.Text, nullable=False, default='[]')
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    # Old finished jobs are pruned by finished_at
+    __table_args__ = (db.Index('ix_background_job_finished', 'finished_at'),)
+
+class Sequence(db.Model):
+    """Named counters: sequences.SequenceAllocator numbers (e.g. estimate numbers) and the catalog version"""
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False)
+
+# Daily rollups of saved estimates, kept current by rollups.record_estimate
+class PatientCategoryDailyRollup(db.Model):
+    """Per day and patient category: saved estimate count and summed totals"""
+    day = db.Column(db.Date, primary_key=True)
+    patient_category = db.Column(db.String(50), primary_key=True)
+    estimates = db.Column(db.Integer, nullable=False, default=0)
+    subtotal = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    total_discount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    final_total = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class UserDailyRollup(db.Model):
+    """Per day and generating user: saved estimate count and summed totals"""
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    estimates = db.Column(db.Integer, nullable=False, default=0)
+    subtotal = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    total_discount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    final_total = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class ServiceCategoryDailyRollup(db.Model):
+    """Per day and service category: estimate line count and summed line amounts.
+    
+    service_category_id 0 collects lines whose service is unknown.
+    """
+    day = db.Column(db.Date, primary_key=True)
+    service_category_id = db.Column(db.Integer, primary_key=True)
+    lines = db.Column(db.Integer, nullable=False, default=0)
+    subtotal = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    total_discount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    final_total = db.Column(db.Numeric(14, 2), nullable=False, default=0)
@@ -0,0 +1,87 @@
+"""Password hashing off the request threads.
+
+werkzeug's password hashes are deliberately expensive. Running them inline
+lets a burst of logins (shift change) occupy every request thread and the
+CPU the worker's other requests need. Hashing and verification instead go to
+a small process pool, and at most PASSWORD_HASH_MAX_PENDING of them may be
+queued or running at once. A request that cannot get a slot within
+PASSWORD_HASH_WAIT seconds fails fast with HashingBusy instead of piling up.
+
+PASSWORD_HASH_METHOD sets the algorithm and cost (any werkzeug method string,
+e.g. ``scrypt:32768:8:1`` or ``pbkdf2:sha256:600000``). Stored hashes made
+with different parameters are upgraded on the next successful login.
+PASSWORD_HASH_WORKERS = 0 hashes inline (one-off scripts, debugging).
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class HashingBusy(Exception):
+    """Too many hash operations are already queued; the caller should retry later."""
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self._executor = None
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+        self.salt_length = app.config.get('PASSWORD_SALT_LENGTH', 16)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1))
+        self.wait = float(app.config.get('PASSWORD_HASH_WAIT', 0.5))
+        self._slots = threading.BoundedSemaphore(
+            app.config.get('PASSWORD_HASH_MAX_PENDING', max(1, self.workers) * 4))
+        self._executor_lock = threading.Lock()
+        # werkzeug fills in defaults (e.g. 'scrypt' -> 'scrypt:32768:8:1'); learn the exact
+        # prefix it writes from one hash, made here rather than through the pool on a login
+        self._stored_prefix = generate_password_hash('', self.method, self.salt_length).split('$', 1)[0]
+        app.extensions['passwords'] = self
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=self.wait):
+            raise HashingBusy('Too many password operations in progress')
+        try:
+            if self.workers <= 0:
+                return func(*args)
+            return self._pool().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def _pool(self):
+        # Started on first use so short-lived processes (CLI, tests) never fork it
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, stored_hash, password):
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        """True if ``stored_hash`` was made with other parameters than PASSWORD_HASH_METHOD."""
+        return stored_hash.split('$', 1)[0] != self._stored_prefix
+
+
+def hash_password(password):
+    return current_app.extensions['passwords'].hash(password)
+
+
+def verify_password(stored_hash, password):
+    return current_app.extensions['passwords'].verify(stored_hash, password)
+
+
+def needs_rehash(stored_hash):
+    return current_app.extensions['passwords'].needs_rehash(stored_hash)
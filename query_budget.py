@@ -0,0 +1,184 @@
+"""Per-endpoint SQL statement budgets.
+
+Views declare how many statements a request may issue with ``@query_budget(n)``.
+The count comes from the per-request SQL counter in ``metrics``, so it covers
+everything the request runs, including lazy loads, except statements that
+refill a shared in-process cache (``metrics.cache_refill()``: the catalog
+version check and snapshot, the user cache). Those land on whichever request
+finds the cache stale, so budgets describe the warm path.
+Going over budget is logged as a warning; with QUERY_BUDGET_STRICT the request
+fails with a 500 instead and every budgeted response carries X-Query-Count
+and X-Query-Budget headers.
+
+``check(create_app)`` builds two scratch databases of different sizes, calls
+each budgeted endpoint against both and fails any endpoint that goes over its
+budget or whose statement count grows with the data (an N+1 pattern).
+"""
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+from flask import current_app, jsonify, request
+
+from models import db, User, Service, ServiceCategory, PatientCategory, Discount, SavedEstimate, SavedEstimateService
+import applog
+import catalog
+import metrics
+
+# (services in the catalog, saved estimates, lines per request) for each scratch database
+CHECK_SIZES = ((20, 10, 3), (2000, 300, 40))
+
+
+def query_budget(statements):
+    """Declare the most SQL statements one request to this view may issue."""
+    def decorate(view):
+        view.query_budget = statements
+        return view
+    return decorate
+
+
+def _enforce(response):
+    budget = getattr(current_app.view_functions.get(request.endpoint), 'query_budget', None)
+    if budget is None:
+        return response
+    statements, _ = metrics.request_sql_stats()
+    statements -= metrics.request_refill_statements()
+    strict = current_app.config.get('QUERY_BUDGET_STRICT', False)
+    if statements > budget:
+        applog.warning('query budget exceeded', endpoint=request.endpoint, statements=statements, budget=budget)
+        if strict:
+            response = jsonify({'error': f'{request.endpoint} issued {statements} SQL statements; budget is {budget}'})
+            response.status_code = 500
+    if strict:
+        response.headers['X-Query-Count'] = str(statements)
+        response.headers['X-Query-Budget'] = str(budget)
+    return response
+
+
+def init_app(app):
+    app.after_request(_enforce)
+
+
+def _seed(services, estimates, lines):
+    """Fill a fresh database with a synthetic catalog and saved estimates."""
+    rng = random.Random(services)
+    category_ids = [c.id for c in ServiceCategory.query.order_by(ServiceCategory.id)]
+    patient_categories = PatientCategory.query.order_by(PatientCategory.id).all()
+    admin_id = User.query.filter_by(username='admin').first().id
+
+    db.session.execute(Service.__table__.insert(), [{
+        'name': f'Service {i}', 'category_id': rng.choice(category_ids),
+        'cost_price': 50, 'mrp': rng.randint(100, 5000),
+        'is_daily_charge': i % 5 == 0, 'visits_per_day': 1
+    } for i in range(services)])
+    db.session.execute(Discount.__table__.insert(), [{
+        'patient_category_id': p.id, 'service_category_id': c,
+        'discount_type': 'percentage', 'discount_value': rng.randint(0, 30)
+    } for p in patient_categories for c in category_ids])
+
+    start = datetime(2025, 1, 1)
+    db.session.execute(SavedEstimate.__table__.insert(), [{
+        'estimate_number': f'SEED{i:06d}', 'patient_name': f'Patient {i}', 'patient_uhid': '',
+        'patient_category': patient_categories[i % len(patient_categories)].name, 'length_of_stay': 2,
+        'subtotal': 1000, 'total_discount': 100, 'final_total': 900, 'generated_by_role': 'admin',
+        'generated_by_user_id': admin_id, 'estimate_data': '{}', 'created_at': start + timedelta(minutes=i)
+    } for i in range(estimates)])
+    estimate_ids = [row.id for row in db.session.query(SavedEstimate.id)]
+    db.session.execute(SavedEstimateService.__table__.insert(), [{
+        'saved_estimate_id': estimate_id, 'service_id': n + 1, 'service_name': f'Service {n}',
+        'quantity': 1, 'unit_price': 100, 'line_total': 100, 'discount_amount': 10, 'final_amount': 90
+    } for estimate_id in estimate_ids for n in range(lines)])
+    db.session.commit()
+    catalog.bump_version()
+    return estimate_ids[-1]
+
+
+def _measure(app, services, estimates, lines):
+    """Return ``{call: (worst statement count, budget)}`` for one scratch database."""
+    with app.app_context():
+        estimate_id = _seed(services, estimates, lines)
+    client = app.test_client()
+    client.post('/api/login', json={'username': 'admin', 'password': 'admin'})
+
+    estimate_request = {
+        'patient_name': 'Budget Check', 'patient_category': 'general', 'length_of_stay': 3,
+        'selected_services': list(range(1, lines + 1))
+    }
+    estimate = client.post('/api/generate-estimate', json=estimate_request).get_json()
+    calls = [
+        ('GET', '/api/services', None),
+        ('GET', '/api/services?limit=100', None),
+        ('GET', '/api/services/search?q=service&limit=20', None),
+        ('GET', '/api/service-categories', None),
+        ('GET', '/api/patient-categories', None),
+        ('GET', '/api/discounts', None),
+        ('GET', '/api/discounts/grid', None),
+        ('GET', '/api/pending-users', None),
+        ('POST', '/api/generate-estimate', estimate_request),
+        ('POST', '/api/generate-estimates', {'estimates': [estimate_request] * 10}),
+        ('POST', '/api/save-estimate', dict(estimate_request, estimate_data=estimate)),
+        ('GET', '/api/saved-estimates?view_all=true', None),
+        ('GET', '/api/saved-estimates?view_all=true&limit=50', None),
+        ('GET', '/api/saved-estimates/<id>', None),
+        ('GET', '/api/saved-estimates/<id>/invoice', None),
+        ('GET', '/api/reports/estimate-totals?group_by=user', None),
+        ('POST', '/api/drafts', estimate_request),
+        ('GET', '/api/drafts/<draft>', None),
+        ('PATCH', '/api/drafts/<draft>', {'length_of_stay': 5, 'add_services': [lines + 1]}),
+        ('POST', '/api/drafts/<saved-draft>/save', None),
+        ('DELETE', '/api/drafts/<deleted-draft>', None),
+    ]
+    drafts = {placeholder: client.post('/api/drafts', json=estimate_request).get_json()['draft_id']
+              for placeholder in ('<draft>', '<saved-draft>', '<deleted-draft>')}
+    counts = {}
+    for method, url, body in calls:
+        # The first call may rebuild the catalog snapshot; keep the worse of two
+        # (a second save or delete of the same draft is a cheaper 404)
+        for _ in range(2):
+            path = url.replace('<id>', str(estimate_id))
+            for placeholder, draft_id in drafts.items():
+                path = path.replace(placeholder, str(draft_id))
+            response = client.open(path, method=method, json=body)
+            if 'X-Query-Count' not in response.headers:
+                raise RuntimeError(f'{method} {url} failed with {response.status_code}: {response.get_data(as_text=True)}')
+            statements = int(response.headers['X-Query-Count'])
+            budget = int(response.headers['X-Query-Budget'])
+            key = f'{method} {url}'
+            counts[key] = (max(counts.get(key, (0,))[0], statements), budget)
+    return counts
+
+
+def check(create_app):
+    """Measure every budgeted call at each of CHECK_SIZES.
+
+    Returns ``{call: (statements per size, budget, problems)}``.
+    """
+    runs = []
+    for services, estimates, lines in CHECK_SIZES:
+        workdir = tempfile.mkdtemp(prefix='query-budget-')
+        try:
+            app = create_app({
+                'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(workdir, "check.db")}',
+                'QUERY_BUDGET_STRICT': True,
+                'INVOICE_CACHE_DIR': os.path.join(workdir, 'invoice-cache')
+            })
+            runs.append(_measure(app, services, estimates, lines))
+            with app.app_context():
+                db.engine.dispose()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        catalog.reset()
+
+    results = {}
+    for call in runs[0]:
+        counts = [run[call][0] for run in runs]
+        budget = runs[0][call][1]
+        problems = []
+        if max(counts) > budget:
+            problems.append(f'over budget of {budget}')
+        if counts[-1] > counts[0]:
+            problems.append(f'statements grow with data ({counts[0]} -> {counts[-1]})')
+        results[call] = (counts, budget, problems)
+    return results
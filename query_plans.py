@@ -0,0 +1,73 @@
+"""EXPLAIN QUERY PLAN checks for the app's hot queries (SQLite only).
+
+Each entry mirrors a query issued by an endpoint. ``check()`` asks SQLite how
+it would run each one and flags plans that scan a whole table or sort rows in
+a temporary b-tree instead of reading them in index order.
+"""
+import re
+from datetime import datetime
+
+from sqlalchemy import and_, or_, select
+
+from models import db, User, Service, Discount, SavedEstimate, SavedEstimateService
+
+_FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+def _saved_estimates_listing():
+    return select(
+        SavedEstimate.id, SavedEstimate.estimate_number, SavedEstimate.patient_name,
+        SavedEstimate.final_total, SavedEstimate.created_at, User.username
+    ).join(User, SavedEstimate.generated_by_user_id == User.id)
+
+
+def _newest_first(query):
+    return query.order_by(SavedEstimate.created_at.desc(), SavedEstimate.id.desc()).limit(51)
+
+
+HOT_QUERIES = {
+    'login': lambda: select(User).where(User.username == 'admin'),
+    'pending users': lambda: select(User).where(User.approved == False, User.rejected == False)
+        .order_by(User.created_at.asc()),
+    'services page by category': lambda: select(Service.id, Service.name)
+        .where(Service.category_id == 1, Service.id > 0).order_by(Service.id).limit(101),
+    'discount for category pair': lambda: select(Discount)
+        .where(Discount.patient_category_id == 1, Discount.service_category_id == 1),
+    'saved estimates for user': lambda: _newest_first(
+        _saved_estimates_listing().where(SavedEstimate.generated_by_user_id == 1)),
+    'saved estimates for user, next page': lambda: _newest_first(
+        _saved_estimates_listing().where(
+            SavedEstimate.generated_by_user_id == 1,
+            or_(SavedEstimate.created_at < datetime(2025, 1, 1),
+                and_(SavedEstimate.created_at == datetime(2025, 1, 1), SavedEstimate.id < 100)))),
+    'saved estimates, all users': lambda: _newest_first(_saved_estimates_listing()),
+    'saved estimates by date range': lambda: _newest_first(
+        _saved_estimates_listing().where(SavedEstimate.created_at >= datetime(2025, 1, 1),
+                                         SavedEstimate.created_at < datetime(2025, 2, 1))),
+    'saved estimate lines': lambda: select(SavedEstimateService)
+        .where(SavedEstimateService.saved_estimate_id == 1),
+}
+
+
+def explain(statement):
+    """Return the EXPLAIN QUERY PLAN detail lines for a SQLAlchemy statement."""
+    compiled = statement.compile(dialect=db.engine.dialect)
+    params = compiled.construct_params()
+    # The plan does not depend on values; pass them as strings to skip bind processing
+    values = tuple(str(params[name]) for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', values)
+    return [row[-1] for row in rows]
+
+
+def problems(plan):
+    """Plan lines that indicate a full table scan or an unindexed sort."""
+    return [line for line in plan if _FULL_SCAN.match(line) or 'TEMP B-TREE' in line]
+
+
+def check():
+    """Return ``{query name: (plan lines, problem lines)}`` for every hot query."""
+    results = {}
+    for name, build in HOT_QUERIES.items():
+        plan = explain(build())
+        results[name] = (plan, problems(plan))
+    return results
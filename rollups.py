@@ -0,0 +1,188 @@
+"""Daily revenue and discount rollups for saved estimates.
+
+One small table per reporting dimension holds per-day sums: by patient
+category, by generating user and by service category (from the estimate
+lines). ``record_estimate`` adds one saved estimate to all three with upserts
+in the caller's transaction, so the rollups commit or roll back with the
+estimate itself. Reports read only the rollups, so their cost depends on the
+number of days and groups in the range, not on the number of estimates.
+
+``rebuild()`` recomputes everything from SavedEstimate/SavedEstimateService,
+for the initial backfill or after bulk changes to estimates.
+
+Days are local (IST, UTC+05:30), the time the app shows on estimates and
+invoices: an estimate saved at 00:30 IST counts towards that day even though
+its UTC ``created_at`` falls on the previous one. Report date ranges are in
+the same local days.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, User, Service, ServiceCategory, SavedEstimate, SavedEstimateService, \
+    PatientCategoryDailyRollup, UserDailyRollup, ServiceCategoryDailyRollup
+
+UNKNOWN_CATEGORY_ID = 0
+# Offset of the displayed local time (IST) from the stored UTC timestamps
+LOCAL_OFFSET = timedelta(hours=5, minutes=30)
+
+# group_by name -> (rollup model, key column, count column)
+GROUPINGS = {
+    'patient_category': (PatientCategoryDailyRollup, 'patient_category', 'estimates'),
+    'service_category': (ServiceCategoryDailyRollup, 'service_category_id', 'lines'),
+    'user': (UserDailyRollup, 'user_id', 'estimates'),
+}
+
+
+def _increment(table, key, rows):
+    """Add ``rows`` onto existing (day, key) rollup rows, inserting the ones that are missing."""
+    keys = ['day', key]
+    values = [c.name for c in table.columns if c.name not in keys]
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        statement = insert.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: table.c[name] + insert.excluded[name] for name in values}
+        )
+        db.session.execute(statement, rows)
+        return
+    for row in rows:
+        updated = db.session.execute(
+            table.update()
+            .where(*(table.c[k] == row[k] for k in keys))
+            .values({name: table.c[name] + row[name] for name in values})
+        )
+        if not updated.rowcount:
+            db.session.execute(table.insert().values(row))
+
+
+def local_day(created_at):
+    """The rollup day of a UTC ``created_at``."""
+    return (created_at + LOCAL_OFFSET).date()
+
+
+def _local_day_column(column):
+    if db.engine.dialect.name == 'sqlite':
+        return func.date(column, f'+{int(LOCAL_OFFSET.total_seconds() // 60)} minutes')
+    return func.date(column + LOCAL_OFFSET)
+
+
+def record_estimate(tariff, day, patient_category, user_id, summary, lines):
+    """Add one saved estimate to the rollups under ``day`` (see local_day); the caller commits.
+
+    ``summary`` has subtotal/total_discount/final_total; each line has
+    service_id, line_total, discount_amount and final_amount. Lines are
+    assigned to service categories through the tariff snapshot.
+    """
+    totals = {
+        'day': day,
+        'estimates': 1,
+        'subtotal': float(summary['subtotal']),
+        'total_discount': float(summary['total_discount']),
+        'final_total': float(summary['final_total'])
+    }
+    _increment(PatientCategoryDailyRollup.__table__, 'patient_category',
+               [dict(totals, patient_category=patient_category)])
+    _increment(UserDailyRollup.__table__, 'user_id', [dict(totals, user_id=user_id)])
+
+    by_category = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    for line in lines:
+        service = tariff.services.get(line['service_id'])
+        category = by_category[service.category_id if service else UNKNOWN_CATEGORY_ID]
+        category[0] += 1
+        category[1] += line['line_total']
+        category[2] += line['discount_amount']
+        category[3] += line['final_amount']
+    if by_category:
+        _increment(ServiceCategoryDailyRollup.__table__, 'service_category_id', [{
+            'day': day,
+            'service_category_id': category_id,
+            'lines': count,
+            'subtotal': subtotal,
+            'total_discount': discount,
+            'final_total': final
+        } for category_id, (count, subtotal, discount, final) in by_category.items()])
+
+
+def rebuild():
+    """Recompute every rollup table from the saved estimates; the caller commits.
+
+    Returns the number of rows written per grouping.
+    """
+    day = _local_day_column(SavedEstimate.created_at)
+    estimate_sums = (func.count(), func.sum(SavedEstimate.subtotal), func.sum(SavedEstimate.total_discount),
+                     func.sum(SavedEstimate.final_total))
+    category_id = func.coalesce(Service.category_id, UNKNOWN_CATEGORY_ID)
+    sources = {
+        'patient_category': select(day, SavedEstimate.patient_category, *estimate_sums)
+            .group_by(day, SavedEstimate.patient_category),
+        'user': select(day, SavedEstimate.generated_by_user_id, *estimate_sums)
+            .group_by(day, SavedEstimate.generated_by_user_id),
+        'service_category': select(
+            day, category_id, func.count(), func.sum(SavedEstimateService.line_total),
+            func.sum(SavedEstimateService.discount_amount), func.sum(SavedEstimateService.final_amount))
+            .select_from(SavedEstimateService)
+            .join(SavedEstimate, SavedEstimateService.saved_estimate_id == SavedEstimate.id)
+            .outerjoin(Service, SavedEstimateService.service_id == Service.id)
+            .group_by(day, category_id),
+    }
+
+    counts = {}
+    for name, (model, key, count) in GROUPINGS.items():
+        table = model.__table__
+        db.session.execute(delete(table))
+        db.session.execute(table.insert().from_select(
+            ['day', key, count, 'subtotal', 'total_discount', 'final_total'], sources[name]))
+        counts[name] = db.session.execute(select(func.count()).select_from(table)).scalar()
+    return counts
+
+
+def report(group_by, date_from=None, date_to=None, by_day=True):
+    """Summed totals between two local dates (inclusive), grouped by ``group_by``.
+
+    Returns a list of dicts with ``day`` (when ``by_day``), ``key``, ``label``,
+    a count (``estimates``, or ``lines`` for service categories) and the
+    subtotal, total_discount and final_total sums.
+    """
+    model, key_name, count_name = GROUPINGS[group_by]
+    key = getattr(model, key_name)
+    group = [model.day, key] if by_day else [key]
+
+    # Aggregate the rollup rows first, then attach labels to the (few) groups
+    sums = select(
+        *group, func.sum(getattr(model, count_name)).label('count'),
+        func.sum(model.subtotal).label('subtotal'), func.sum(model.total_discount).label('total_discount'),
+        func.sum(model.final_total).label('final_total')
+    ).group_by(*group)
+    if date_from:
+        sums = sums.where(model.day >= date_from)
+    if date_to:
+        sums = sums.where(model.day < date_to + timedelta(days=1))
+    sums = sums.subquery()
+
+    key = sums.c[key_name]
+    if group_by == 'service_category':
+        query = select(sums, func.coalesce(ServiceCategory.display_name, 'Unknown').label('label')) \
+            .outerjoin(ServiceCategory, key == ServiceCategory.id)
+    elif group_by == 'user':
+        query = select(sums, User.username.label('label')).outerjoin(User, key == User.id)
+    else:
+        query = select(sums, key.label('label'))
+    query = query.order_by(sums.c.day, key) if by_day else query.order_by(key)
+
+    rows = []
+    for row in db.session.execute(query).mappings():
+        entry = {'day': row['day'].isoformat()} if by_day else {}
+        entry.update({
+            'key': row[key_name],
+            'label': row['label'],
+            count_name: int(row['count']),
+            'subtotal': round(float(row['subtotal']), 2),
+            'total_discount': round(float(row['total_discount']), 2),
+            'final_total': round(float(row['final_total']), 2)
+        })
+        rows.append(entry)
+    return rows
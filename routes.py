@@ -1,11 +1,32 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, current_app, stream_with_context
 from flask_login import login_required, current_user, login_user, logout_user
-from models import User, Service, ServiceCategory, PatientCategory, Discount, SavedEstimate, SavedEstimateService, db
+from models import User, Service, ServiceCategory, PatientCategory, Discount, SavedEstimate, SavedEstimateService, \
+    EstimateDraft, db
+from catalog import CategoryEntry, bump_version, cached_body, get_tariff
+from pricing import price_estimates
+from search import get_index as get_search_index
+from importer import ImportInterrupted, UploadError, import_discounts, import_services
+from ingest import iter_upload_rows
+import discount_grid
+from sequences import next_estimate_number
+from user_cache import invalidate_user
+from invoice_cache import cached_invoice
+from passwords import HashingBusy, hash_password, needs_rehash, verify_password
+import estimate_storage
+import rollups
+import drafts
+import applog
+from query_budget import query_budget
+from werkzeug.datastructures import FileStorage
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import undefer
 from datetime import datetime, timedelta
+import base64
 import csv
 import io
 import json
-import pandas as pd
+import os
+import tempfile
 
 main = Blueprint('main', __name__)
 
@@ -44,6 +65,7 @@ def dashboard():
 # User approval endpoints
 @main.route('/api/pending-users', methods=['GET'])
 @login_required
+@query_budget(1)
 def get_pending_users():
     if not current_user.is_admin:
         return jsonify({'error': 'Admin access required'}), 403
@@ -68,6 +90,7 @@ def approve_user(user_id):
 
     user.approved = True
     db.session.commit()
+    invalidate_user(user_id)
     return jsonify({'message': 'User approved successfully'})
 
 @main.route('/api/users/<int:user_id>/reject', methods=['POST'])
@@ -82,6 +105,7 @@ def reject_user(user_id):
     
     user.rejected = True
     db.session.commit()
+    invalidate_user(user_id)
     return jsonify({'message': 'User rejected successfully'})
 
 @main.route('/api/signup', methods=['POST'])
@@ -110,8 +134,12 @@ def signup():
     is_first_admin = role == 'admin' and User.query.count() == 0
     approved = is_first_admin  # First admin is auto-approved
     
-    user = User(username=username, role=role, approved=approved)
-    user.set_password(password)
+    try:
+        password_hash = hash_password(password)
+    except HashingBusy:
+        return jsonify({'error': 'Too many sign-ups in progress, please retry shortly'}), 503
+    
+    user = User(username=username, role=role, approved=approved, password=password_hash)
     db.session.add(user)
     db.session.commit()
     
@@ -129,9 +157,21 @@ def login():
         return jsonify({'error': 'username and password required'}), 400
     
     user = User.query.filter_by(username=username).first()
-    if not user or not user.check_password(password):
-        # hide whether user exists; return generic message
-        return jsonify({'error': 'invalid credentials'}), 401
+    try:
+        if not user or not verify_password(user.password, password):
+            # hide whether user exists; return generic message
+            return jsonify({'error': 'invalid credentials'}), 401
+    except HashingBusy:
+        return jsonify({'error': 'Too many sign-ins in progress, please retry shortly'}), 503
+    
+    # Upgrade hashes made with older cost parameters while we have the password;
+    # best effort, a busy pool leaves it for a later login
+    if needs_rehash(user.password):
+        try:
+            user.password = hash_password(password)
+            db.session.commit()
+        except HashingBusy:
+            pass
 
     login_user(user)
     return jsonify({
@@ -161,22 +201,146 @@ def user_info():
         'rejected': current_user.rejected
     })
 
+# Catalog listings are served from a cached, pre-serialized body keyed by the
+# catalog version, with a strong ETag so clients can revalidate cheaply.
+def _dump_json(data):
+    return (current_app.json.dumps(data) + "\n").encode('utf-8')
+
+def _catalog_response(key, serialize):
+    body, etag = cached_body(key, serialize)
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Keyset pagination cursors are opaque to clients: base64url-encoded JSON of the
+# sort key of the last row on the previous page.
+def _encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def _decode_cursor(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+
+def _page_limit(default=100, maximum=1000):
+    limit = int(request.args.get('limit', default))
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    return min(limit, maximum)
+
+_SERVICE_FILTER_ARGS = ('limit', 'cursor', 'category', 'category_id', 'is_daily_charge', 'min_price', 'max_price')
+
 # Services API
 @main.route('/api/services', methods=['GET'])
 @login_required
+@query_budget(1)
 def get_services():
-    services = Service.query.all()
-    return jsonify([{
-        'id': s.id,
-        'name': s.name,
-        'category_id': s.category_id,
-        'category_name': s.category.name,
-        'category_display_name': s.category.display_name,
-        'cost_price': float(s.cost_price),
-        'mrp': float(s.mrp),
-        'is_daily_charge': s.is_daily_charge,
-        'visits_per_day': s.visits_per_day
-    } for s in services])
+    if any(arg in request.args for arg in _SERVICE_FILTER_ARGS):
+        return _get_services_page()
+    
+    def serialize(tariff):
+        categories = tariff.service_categories
+        return _dump_json([{
+            'id': s.id,
+            'name': s.name,
+            'category_id': s.category_id,
+            'category_name': categories[s.category_id].name,
+            'category_display_name': categories[s.category_id].display_name,
+            'cost_price': s.cost_price,
+            'mrp': s.mrp,
+            'is_daily_charge': s.is_daily_charge,
+            'visits_per_day': s.visits_per_day
+        } for s in tariff.services.values()])
+    
+    return _catalog_response('services', serialize)
+
+def _get_services_page():
+    """Keyset-paginated, filtered service listing.
+    
+    Query args: limit, cursor, category (name), category_id, is_daily_charge (true/false),
+    min_price and max_price (on MRP). Returns {"services": [...], "next_cursor": token or null};
+    pass next_cursor back as cursor to fetch the following page.
+    """
+    try:
+        limit = _page_limit()
+        query = db.session.query(
+            Service.id, Service.name, Service.category_id, Service.cost_price, Service.mrp,
+            Service.is_daily_charge, Service.visits_per_day,
+            ServiceCategory.name.label('category_name'),
+            ServiceCategory.display_name.label('category_display_name')
+        ).join(ServiceCategory, Service.category_id == ServiceCategory.id)
+        
+        args = request.args
+        if args.get('cursor'):
+            (last_id,) = _decode_cursor(args['cursor'])
+            query = query.filter(Service.id > int(last_id))
+        if args.get('category'):
+            query = query.filter(ServiceCategory.name == args['category'])
+        if args.get('category_id'):
+            query = query.filter(Service.category_id == int(args['category_id']))
+        if args.get('is_daily_charge'):
+            query = query.filter(Service.is_daily_charge == (args['is_daily_charge'].lower() == 'true'))
+        if args.get('min_price'):
+            query = query.filter(Service.mrp >= float(args['min_price']))
+        if args.get('max_price'):
+            query = query.filter(Service.mrp <= float(args['max_price']))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid query parameter: {str(e)}'}), 400
+    
+    # Fetch one extra row to learn whether another page follows
+    rows = query.order_by(Service.id).limit(limit + 1).all()
+    next_cursor = _encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+    
+    return jsonify({
+        'services': [{
+            'id': s.id,
+            'name': s.name,
+            'category_id': s.category_id,
+            'category_name': s.category_name,
+            'category_display_name': s.category_display_name,
+            'cost_price': float(s.cost_price),
+            'mrp': float(s.mrp),
+            'is_daily_charge': s.is_daily_charge,
+            'visits_per_day': s.visits_per_day
+        } for s in rows[:limit]],
+        'next_cursor': next_cursor
+    })
+
+@main.route('/api/services/search', methods=['GET'])
+@login_required
+@query_budget(0)
+def search_services():
+    """Typeahead search: ?q=<text>&limit=<k>. Every word in q must prefix a word of the name."""
+    query = request.args.get('q', '')
+    try:
+        limit = _page_limit(default=10, maximum=50)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {str(e)}'}), 400
+    
+    tariff = get_tariff()
+    categories = tariff.service_categories
+    results = []
+    for service_id in get_search_index().search(query, limit):
+        # The index can lag a catalog edit while its successor is being built
+        s = tariff.services.get(service_id)
+        if s is None:
+            continue
+        results.append({
+            'id': s.id,
+            'name': s.name,
+            'category_id': s.category_id,
+            'category_name': categories[s.category_id].name,
+            'category_display_name': categories[s.category_id].display_name,
+            'mrp': s.mrp,
+            'is_daily_charge': s.is_daily_charge,
+            'visits_per_day': s.visits_per_day
+        })
+    return jsonify(results)
 
 @main.route('/api/services', methods=['POST'])
 @login_required
@@ -206,6 +370,7 @@ def create_service():
         )
         db.session.add(service)
         db.session.commit()
+        bump_version()
         return jsonify({'id': service.id, 'message': 'Service created successfully'}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -228,6 +393,7 @@ def update_service(service_id):
     
     try:
         db.session.commit()
+        bump_version()
         return jsonify({'message': 'Service updated successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -242,6 +408,7 @@ def delete_service(service_id):
     try:
         db.session.delete(service)
         db.session.commit()
+        bump_version()
         return jsonify({'message': 'Service deleted successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -249,45 +416,87 @@ def delete_service(service_id):
 # Categories API
 @main.route('/api/service-categories', methods=['GET'])
 @login_required
+@query_budget(0)
 def get_service_categories():
-    categories = ServiceCategory.query.all()
-    print("\n=== Service Categories from Database ===")
-    for c in categories:
-        print(f"ID: {c.id}, Name: {c.name}, Display Name: {c.display_name}")
-    print("=====================================\n")
+    def serialize(tariff):
+        categories = tariff.service_categories.values()
+        applog.debug('service categories serialized', count=len(categories), catalog_version=tariff.version)
+        
+        return _dump_json([{
+            'id': c.id,
+            'name': c.name,
+            'display_name': c.display_name
+        } for c in categories])
     
-    return jsonify([{
-        'id': c.id,
-        'name': c.name,
-        'display_name': c.display_name
-    } for c in categories])
+    return _catalog_response('service-categories', serialize)
 
 @main.route('/api/patient-categories', methods=['GET'])
 @login_required
+@query_budget(0)
 def get_patient_categories():
-    categories = PatientCategory.query.all()
-    return jsonify([{
-        'id': c.id,
-        'name': c.name,
-        'display_name': c.display_name
-    } for c in categories])
+    def serialize(tariff):
+        return _dump_json([{
+            'id': c.id,
+            'name': c.name,
+            'display_name': c.display_name
+        } for c in tariff.patient_categories.values()])
+    
+    return _catalog_response('patient-categories', serialize)
 
 # Discounts API
 @main.route('/api/discounts', methods=['GET'])
 @login_required
+@query_budget(0)
 def get_discounts():
-    discounts = Discount.query.all()
-    return jsonify([{
-        'id': d.id,
-        'patient_category_id': d.patient_category_id,
-        'patient_category_name': d.patient_category.name,
-        'patient_category_display': d.patient_category.display_name,
-        'service_category_id': d.service_category_id,
-        'service_category_name': d.service_category.name,
-        'service_category_display': d.service_category.display_name,
-        'discount_type': d.discount_type,
-        'discount_value': float(d.discount_value)
-    } for d in discounts])
+    def serialize(tariff):
+        patient_categories = {c.id: c for c in tariff.patient_categories.values()}
+        service_categories = tariff.service_categories
+        discounts = sorted(tariff.discounts.values(), key=lambda d: d.id)
+        return _dump_json([{
+            'id': d.id,
+            'patient_category_id': d.patient_category_id,
+            'patient_category_name': patient_categories[d.patient_category_id].name,
+            'patient_category_display': patient_categories[d.patient_category_id].display_name,
+            'service_category_id': d.service_category_id,
+            'service_category_name': service_categories[d.service_category_id].name,
+            'service_category_display': service_categories[d.service_category_id].display_name,
+            'discount_type': d.discount_type,
+            'discount_value': d.discount_value
+        } for d in discounts])
+    
+    return _catalog_response('discounts', serialize)
+
+@main.route('/api/discounts/grid', methods=['GET'])
+@login_required
+@query_budget(0)
+def get_discount_grid():
+    """Whole discount matrix: {patient_categories, service_categories, cells[i][j]}"""
+    return _catalog_response('discount-grid', lambda tariff: _dump_json(discount_grid.read_grid(tariff)))
+
+@main.route('/api/discounts/grid', methods=['PUT'])
+@login_required
+def update_discount_grid():
+    """Apply a full or partial discount matrix in one transaction.
+    
+    Body: {"cells": {patient_category: {service_category: {discount_type, discount_value} | null}},
+           "replace": false}. With replace=true, discounts missing from cells are removed.
+    """
+    if not (current_user.is_admin or current_user.is_manager):
+        return jsonify({'error': 'Admin or manager access required'}), 403
+    
+    data = request.get_json() or {}
+    changes, errors = discount_grid.parse_grid(get_tariff(), data.get('cells'))
+    if errors:
+        return jsonify({'error': 'Invalid discount grid', 'errors': errors}), 400
+    
+    try:
+        counts = discount_grid.apply_changes(changes, replace=bool(data.get('replace')))
+        db.session.commit()
+        bump_version()
+        return jsonify(dict(counts, message='Discount grid updated successfully'))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
 
 @main.route('/api/discounts', methods=['POST'])
 @login_required
@@ -320,6 +529,7 @@ def create_discount():
             message = 'Discount created successfully'
         
         db.session.commit()
+        bump_version()
         return jsonify({'id': existing.id, 'message': message})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -334,6 +544,7 @@ def delete_discount(discount_id):
     try:
         db.session.delete(discount)
         db.session.commit()
+        bump_version()
         return jsonify({'message': 'Discount deleted successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -355,11 +566,65 @@ def update_discount(discount_id):
 
     try:
         db.session.commit()
+        bump_version()
         return jsonify({'message': 'Discount updated successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
 # Bulk Upload API
+# Uploads run inline by default. With ?async=true the file is spooled to disk and
+# imported on the background job runner; the response is a job id to poll at
+# /api/jobs/<id>, whose final "result" has the same shape as the inline response.
+def _upload_extension(file):
+    return '.' + file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
+
+def _wants_async():
+    return request.args.get('async', 'false').lower() == 'true'
+
+def _spool_upload(file, file_extension):
+    fd, path = tempfile.mkstemp(suffix=file_extension, dir=current_app.config.get('UPLOAD_SPOOL_DIR'))
+    with os.fdopen(fd, 'wb') as spool:
+        file.save(spool)
+    return path
+
+def _submit_upload(kind, file, file_extension, run_import):
+    path = _spool_upload(file, file_extension)
+    filename = file.filename
+    
+    def run(job):
+        try:
+            with open(path, 'rb') as stream:
+                rows = iter_upload_rows(FileStorage(stream, filename), file_extension)
+                return run_import(rows, on_progress=job.report)
+        finally:
+            os.remove(path)
+    
+    job = current_app.extensions['jobs'].submit(kind, current_user.id, run)
+    return jsonify({'job_id': job.id, 'status': job.status, 'status_url': url_for('main.get_job', job_id=job.id)}), 202
+
+def _import_services_result(rows, on_progress=None):
+    try:
+        result = import_services(rows, on_progress=on_progress)
+    finally:
+        # Chunks committed before a failure are still visible
+        bump_version()
+    return {
+        'success_count': result['success_count'], 
+        'errors': result['errors'],
+        'chunks_committed': result['chunks'],
+        'message': f'Successfully processed {result["success_count"]} services'
+    }
+
+def _import_discounts_result(rows, on_progress=None):
+    result = import_discounts(rows, on_progress=on_progress)
+    if result['success_count'] > 0:
+        bump_version()
+    return {
+        'success_count': result['success_count'], 
+        'errors': result['errors'],
+        'message': f'Successfully processed {result["success_count"]} discounts'
+    }
+
 @main.route('/api/bulk-upload/services', methods=['POST'])
 @login_required
 def bulk_upload_services():
@@ -376,75 +641,25 @@ def bulk_upload_services():
     
     # Check file extension
     allowed_extensions = ['.csv', '.xlsx', '.xls']
-    file_extension = '.' + file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
+    file_extension = _upload_extension(file)
     if file_extension not in allowed_extensions:
         return jsonify({'error': 'Only CSV (.csv) and Excel (.xlsx, .xls) files are allowed'}), 400
     
+    if _wants_async():
+        return _submit_upload('bulk-upload-services', file, file_extension, _import_services_result)
+    
     try:
-        # Read file content based on file type
-        if file_extension == '.csv':
-            # Read CSV file
-            content = file.read().decode('utf-8')
-            csv_reader = csv.DictReader(io.StringIO(content))
-            rows = list(csv_reader)
-        else:
-            # Read Excel file
-            df = pd.read_excel(file)
-            rows = df.to_dict('records')
-        
-        # Validate required columns
-        required_columns = ['name', 'category_name', 'cost_price', 'mrp', 'is_daily_charge']
-        if not rows:
-            return jsonify({'error': 'File is empty or has no data rows'}), 400
-        
-        missing_columns = []
-        for col in required_columns:
-            if col not in rows[0]:
-                missing_columns.append(col)
-        
-        if missing_columns:
-            return jsonify({'error': f'Missing required columns: {", ".join(missing_columns)}'}), 400
-        
-        # Process data
-        category_map = {cat.name: cat.id for cat in ServiceCategory.query.all()}
-        success_count = 0
-        errors = []
-        
-        for row_num, row in enumerate(rows, start=2):
-            try:
-                name = str(row.get('name', '')).strip()
-                category_name = str(row.get('category_name', '')).strip()
-                
-                if not name or not category_name or category_name not in category_map:
-                    errors.append(f"Row {row_num}: Invalid name or category '{category_name}'")
-                    continue
-                
-                # Convert boolean values
-                is_daily_charge = str(row.get('is_daily_charge', '')).lower() in ['1', 'true', 'yes', 'True', '1.0']
-                
-                service = Service(
-                    name=name,
-                    category_id=category_map[category_name],
-                    cost_price=float(row.get('cost_price', 0)),
-                    mrp=float(row.get('mrp', 0)),
-                    is_daily_charge=is_daily_charge,
-                    visits_per_day=int(float(row.get('visits_per_day', 1)))
-                )
-                db.session.add(service)
-                success_count += 1
-                
-            except Exception as e:
-                errors.append(f"Row {row_num}: {str(e)}")
-        
-        if success_count > 0:
-            db.session.commit()
-        
+        return jsonify(_import_services_result(iter_upload_rows(file, file_extension)))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except ImportInterrupted as e:
+        # Earlier chunks are committed; report them alongside the failure
         return jsonify({
-            'success_count': success_count, 
-            'errors': errors,
-            'message': f'Successfully processed {success_count} services'
-        })
-        
+            'error': f'Error processing file: {str(e)}',
+            'success_count': e.result['success_count'],
+            'errors': e.result['errors'],
+            'chunks_committed': e.result['chunks']
+        }), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Error processing file: {str(e)}'}), 400
@@ -469,107 +684,30 @@ def bulk_upload_discounts():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Read file content
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(file)
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file)
-        else:
+        file_extension = _upload_extension(file)
+        if file_extension not in ['.csv', '.xlsx', '.xls']:
             return jsonify({'error': 'Invalid file format. Please upload CSV or Excel file.'}), 400
         
-        # Convert to list of dictionaries
-        rows = df.to_dict('records')
-        
-        if not rows:
-            return jsonify({'error': 'File is empty'}), 400
-        
-        # Validate required columns
-        required_columns = ['patient_category', 'service_category', 'discount_type', 'discount_value']
-        missing_columns = []
-        for col in required_columns:
-            if col not in rows[0]:
-                missing_columns.append(col)
-        
-        if missing_columns:
-            return jsonify({'error': f'Missing required columns: {", ".join(missing_columns)}'}), 400
+        if _wants_async():
+            return _submit_upload('bulk-upload-discounts', file, file_extension, _import_discounts_result)
         
-        # Get existing categories for validation
-        service_categories = {cat.name: cat.id for cat in ServiceCategory.query.all()}
-        patient_categories = {cat.name: cat.id for cat in PatientCategory.query.all()}
-        
-        success_count = 0
-        errors = []
-        
-        for row_num, row in enumerate(rows, start=2):
-            try:
-                patient_category = str(row.get('patient_category', '')).strip()
-                service_category = str(row.get('service_category', '')).strip()
-                discount_type = str(row.get('discount_type', '')).strip().lower()
-                discount_value = row.get('discount_value', 0)
-                
-                # Validate patient category
-                if patient_category not in patient_categories:
-                    errors.append(f"Row {row_num}: Invalid patient category '{patient_category}'. Valid options: {list(patient_categories.keys())}")
-                    continue
-                
-                # Validate service category
-                if service_category not in service_categories:
-                    errors.append(f"Row {row_num}: Invalid service category '{service_category}'. Valid options: {list(service_categories.keys())}")
-                    continue
-                
-                # Validate discount type
-                if discount_type not in ['percentage', 'fixed']:
-                    errors.append(f"Row {row_num}: Discount type must be 'percentage' or 'fixed'")
-                    continue
-                
-                # Validate discount value
-                try:
-                    discount_value = float(discount_value)
-                    if discount_value < 0:
-                        errors.append(f"Row {row_num}: Discount value cannot be negative")
-                        continue
-                except (ValueError, TypeError):
-                    errors.append(f"Row {row_num}: Invalid discount value")
-                    continue
-                
-                # Check if discount already exists
-                existing_discount = Discount.query.filter_by(
-                    patient_category_id=patient_categories[patient_category],
-                    service_category_id=service_categories[service_category]
-                ).first()
-                
-                if existing_discount:
-                    # Update existing discount
-                    existing_discount.discount_type = discount_type
-                    existing_discount.discount_value = discount_value
-                else:
-                    # Create new discount
-                    discount = Discount(
-                        patient_category_id=patient_categories[patient_category],
-                        service_category_id=service_categories[service_category],
-                        discount_type=discount_type,
-                        discount_value=discount_value
-                    )
-                    db.session.add(discount)
-                
-                success_count += 1
-                
-            except Exception as e:
-                errors.append(f"Row {row_num}: {str(e)}")
-        
-        if success_count > 0:
-            db.session.commit()
-        
-        return jsonify({
-            'success_count': success_count, 
-            'errors': errors,
-            'message': f'Successfully processed {success_count} discounts'
-        })
+        return jsonify(_import_discounts_result(iter_upload_rows(file, file_extension)))
         
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Error processing file: {str(e)}'}), 400
 
+@main.route('/api/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    """Status of a background job: progress, errors so far and, once finished, the result"""
+    job = current_app.extensions['jobs'].get(job_id)
+    if job is None or not (current_user.is_admin or job.user_id == current_user.id):
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
 @main.route('/api/bulk-upload/discounts/template', methods=['GET'])
 @login_required
 def get_discounts_template():
@@ -592,116 +730,175 @@ def get_discounts_template():
     
     return jsonify({'template': template})
 
+def _lookup_services(tariff, service_ids):
+    """Resolve selected service ids against the tariff, in id order, skipping unknown ids"""
+    ids = set()
+    for service_id in service_ids:
+        try:
+            ids.add(int(service_id))
+        except (TypeError, ValueError):
+            continue
+    return [tariff.services[i] for i in sorted(ids) if i in tariff.services]
+
+def _parse_estimate_request(tariff, data, required_fields, require_services=True):
+    """Validate one estimate request. Returns (error, (patient_cat, length_of_stay, services))"""
+    missing_fields = [field for field in required_fields if not data.get(field)]
+    if missing_fields:
+        return f'Missing required fields: {", ".join(missing_fields)}', None
+    
+    length_of_stay = int(data['length_of_stay'])
+    if length_of_stay < 1:
+        return 'Length of stay must be at least 1 day', None
+    
+    # Get patient category details
+    patient_cat = tariff.patient_categories.get(data['patient_category'])
+    if not patient_cat:
+        return 'Invalid patient category', None
+    
+    # Get selected services
+    selected_services = data.get('selected_services') or []
+    if not isinstance(selected_services, list):
+        return 'selected_services must be a list of service ids', None
+    services = _lookup_services(tariff, selected_services)
+    if not services and require_services:
+        return 'No valid services selected', None
+    
+    return None, (patient_cat, length_of_stay, services)
+
+def _build_estimate(data, patient_cat, length_of_stay, estimate_lines, summary):
+    return {
+        'patient_details': {
+            'name': data.get('patient_name', ''),
+            'uhid': data.get('patient_uhid', 'Not provided'),
+            'category': patient_cat.display_name,
+            'length_of_stay': length_of_stay
+        },
+        'estimate_lines': estimate_lines,
+        'summary': summary,
+        'generated_at': (datetime.utcnow() + rollups.LOCAL_OFFSET).strftime('%Y-%m-%d %H:%M:%S'),
+        'generated_by': current_user.role.capitalize()
+    }
+
 @main.route('/api/generate-estimate', methods=['POST'])
 @login_required
+@query_budget(0)
 def generate_estimate():
     """Generate detailed estimate with invoice format"""
     try:
         data = request.get_json() or {}
         
-        # Validate required fields
+        tariff = get_tariff()
         required_fields = ['patient_name', 'patient_category', 'length_of_stay', 'selected_services']
-        missing_fields = [field for field in required_fields if not data.get(field)]
-        if missing_fields:
-            return jsonify({'error': f'Missing required fields: {", ".join(missing_fields)}'}), 400
-        
-        patient_name = data['patient_name']
-        patient_uhid = data.get('patient_uhid', 'Not provided')
-        patient_category = data['patient_category']
-        length_of_stay = int(data['length_of_stay'])
-        selected_services = data['selected_services']  # List of service IDs
+        error, parsed = _parse_estimate_request(tariff, data, required_fields)
+        if error:
+            return jsonify({'error': error}), 400
         
-        if length_of_stay < 1:
-            return jsonify({'error': 'Length of stay must be at least 1 day'}), 400
+        estimate_lines, summary = price_estimates(tariff, [parsed])[0]
+        patient_cat, length_of_stay, _ = parsed
+        return jsonify(_build_estimate(data, patient_cat, length_of_stay, estimate_lines, summary))
         
-        # Get patient category details
-        patient_cat = PatientCategory.query.filter_by(name=patient_category).first()
-        if not patient_cat:
-            return jsonify({'error': 'Invalid patient category'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error generating estimate: {str(e)}'}), 500
+
+@main.route('/api/generate-estimates', methods=['POST'])
+@login_required
+@query_budget(0)
+def generate_estimates():
+    """Price a batch of estimate requests in one call.
+    
+    Body: {"estimates": [{patient_category, length_of_stay, selected_services, ...}, ...]}.
+    Each entry of the response's "estimates" list is either a full estimate, in the same
+    shape as /api/generate-estimate, or {"error": ...} for a request that failed validation.
+    """
+    try:
+        data = request.get_json() or {}
+        batch = data.get('estimates')
+        if not isinstance(batch, list) or not batch:
+            return jsonify({'error': 'estimates must be a non-empty list'}), 400
         
-        # Get selected services
-        services = Service.query.filter(Service.id.in_(selected_services)).all()
-        if not services:
-            return jsonify({'error': 'No valid services selected'}), 400
+        max_batch = current_app.config.get('MAX_BATCH_ESTIMATES', 1000)
+        if len(batch) > max_batch:
+            return jsonify({'error': f'At most {max_batch} estimates can be generated per request'}), 400
         
-        # Calculate estimate
-        estimate_lines = []
-        subtotal = 0
-        total_discount = 0
-        
-        for service in services:
-            # Get applicable discount for this service category and patient category
-            discount = Discount.query.filter_by(
-                patient_category_id=patient_cat.id,
-                service_category_id=service.category_id
-            ).first()
-            
-            # Calculate base cost
-            if service.is_daily_charge:
-                quantity = length_of_stay * service.visits_per_day
-                unit_description = f"{service.visits_per_day} visits/day × {length_of_stay} days"
+        tariff = get_tariff()
+        required_fields = ['patient_category', 'length_of_stay', 'selected_services']
+        results = [None] * len(batch)
+        valid = []
+        for index, item in enumerate(batch):
+            if item is not None and not isinstance(item, dict):
+                results[index] = {'error': 'Each estimate must be a JSON object'}
+                continue
+            try:
+                error, parsed = _parse_estimate_request(tariff, item or {}, required_fields)
+            except (TypeError, ValueError) as e:
+                error = str(e)
+            if error:
+                results[index] = {'error': error}
             else:
-                quantity = 1
-                unit_description = "One-time charge"
-            
-            line_total = float(service.mrp) * quantity
-            
-            # Apply discount if applicable
-            discount_amount = 0
-            discount_percentage = 0
-            if discount:
-                if discount.discount_type == 'percentage':
-                    discount_percentage = float(discount.discount_value)
-                    discount_amount = line_total * (discount_percentage / 100)
-                else:  # flat discount
-                    discount_amount = float(discount.discount_value) * quantity
-                    discount_percentage = (discount_amount / line_total * 100) if line_total > 0 else 0
-            
-            final_amount = line_total - discount_amount
-            
-            estimate_lines.append({
-                'service_name': service.name,
-                'category': service.category.display_name,
-                'unit_price': float(service.mrp),
-                'quantity': quantity,
-                'unit_description': unit_description,
-                'line_total': line_total,
-                'discount_percentage': round(discount_percentage, 2),
-                'discount_amount': round(discount_amount, 2),
-                'final_amount': round(final_amount, 2)
-            })
-            
-            subtotal += line_total
-            total_discount += discount_amount
-        
-        final_total = subtotal - total_discount
-        
-        # Prepare estimate response
-        estimate = {
-            'patient_details': {
-                'name': patient_name,
-                'uhid': patient_uhid,
-                'category': patient_cat.display_name,
-                'length_of_stay': length_of_stay
-            },
-            'estimate_lines': estimate_lines,
-            'summary': {
-                'subtotal': round(subtotal, 2),
-                'total_discount': round(total_discount, 2),
-                'final_total': round(final_total, 2),
-                'discount_percentage': round((total_discount / subtotal * 100) if subtotal > 0 else 0, 2)
-            },
-            'generated_at': (datetime.utcnow() + timedelta(hours=5, minutes=30)).strftime('%Y-%m-%d %H:%M:%S'),
-            'generated_by': current_user.role.capitalize()
-        }
+                valid.append((index, item, parsed))
         
-        return jsonify(estimate)
+        priced = price_estimates(tariff, [parsed for _, _, parsed in valid])
+        for (index, item, (patient_cat, length_of_stay, _)), (estimate_lines, summary) in zip(valid, priced):
+            results[index] = _build_estimate(item, patient_cat, length_of_stay, estimate_lines, summary)
+        
+        return jsonify({'estimates': results})
         
     except Exception as e:
-        return jsonify({'error': f'Error generating estimate: {str(e)}'}), 500
+        return jsonify({'error': f'Error generating estimates: {str(e)}'}), 500
+
+def _persist_estimate(estimate_data, patient_name, patient_uhid, patient_category, length_of_stay):
+    """Add a SavedEstimate with its lines and rollups; the caller commits.
+    
+    Returns (estimate_number, estimate_id).
+    """
+    created_at = datetime.utcnow()
+    
+    # Generate estimate number
+    new_number = next_estimate_number()
+    
+    # Create saved estimate record
+    saved_estimate = SavedEstimate(
+        estimate_number=new_number,
+        patient_name=patient_name,
+        patient_uhid=patient_uhid,
+        patient_category=patient_category,
+        length_of_stay=int(length_of_stay),
+        subtotal=float(estimate_data['summary']['subtotal']),
+        total_discount=float(estimate_data['summary']['total_discount']),
+        final_total=float(estimate_data['summary']['final_total']),
+        generated_by_role=current_user.role,
+        generated_by_user_id=current_user.id,
+        created_at=created_at,
+        estimate_data=estimate_storage.encode(estimate_data)
+    )
+    
+    db.session.add(saved_estimate)
+    db.session.flush()  # Get the ID for the estimate
+    
+    # Save individual services in one executemany INSERT
+    lines = [{
+        'saved_estimate_id': saved_estimate.id,
+        'service_id': line.get('service_id', 0),  # May not be available in frontend
+        'service_name': line['service_name'],
+        'quantity': line['quantity'],
+        'unit_price': float(line['unit_price']),
+        'line_total': float(line['line_total']),
+        'discount_amount': float(line['discount_amount']),
+        'final_amount': float(line['final_amount'])
+    } for line in estimate_data['estimate_lines']]
+    if lines:
+        db.session.execute(SavedEstimateService.__table__.insert(), lines)
+    
+    # Daily rollups commit (or roll back) together with the estimate
+    rollups.record_estimate(get_tariff(), rollups.local_day(created_at), saved_estimate.patient_category,
+                            current_user.id, estimate_data['summary'], lines)
+    
+    # Read the id before commit expires the instance and forces a reload
+    return new_number, saved_estimate.id
 
 @main.route('/api/save-estimate', methods=['POST'])
 @login_required
+@query_budget(10)
 def save_estimate():
     """Save estimate to database"""
     try:
@@ -713,93 +910,223 @@ def save_estimate():
         if missing_fields:
             return jsonify({'error': f'Missing required fields: {", ".join(missing_fields)}'}), 400
         
-        estimate_data = data['estimate_data']
+        new_number, estimate_id = _persist_estimate(
+            data['estimate_data'], data['patient_name'], data.get('patient_uhid', ''),
+            data['patient_category'], data['length_of_stay'])
+        db.session.commit()
         
-        # Generate estimate number
-        last_estimate = SavedEstimate.query.order_by(SavedEstimate.id.desc()).first()
-        if last_estimate:
-            last_number = int(last_estimate.estimate_number[3:])  # Remove 'EST' prefix
-            new_number = f"EST{last_number + 1:03d}"
-        else:
-            new_number = "EST001"
-        
-        # Create saved estimate record
-        saved_estimate = SavedEstimate(
-            estimate_number=new_number,
-            patient_name=data['patient_name'],
-            patient_uhid=data.get('patient_uhid', ''),
-            patient_category=data['patient_category'],
-            length_of_stay=int(data['length_of_stay']),
-            subtotal=float(estimate_data['summary']['subtotal']),
-            total_discount=float(estimate_data['summary']['total_discount']),
-            final_total=float(estimate_data['summary']['final_total']),
-            generated_by_role=current_user.role,
-            generated_by_user_id=current_user.id,
-            estimate_data=json.dumps(estimate_data)
-        )
+        return jsonify({
+            'message': 'Estimate saved successfully',
+            'estimate_number': new_number,
+            'estimate_id': estimate_id
+        })
         
-        db.session.add(saved_estimate)
-        db.session.flush()  # Get the ID for the estimate
-        
-        # Save individual services
-        for line in estimate_data['estimate_lines']:
-            service_record = SavedEstimateService(
-                saved_estimate_id=saved_estimate.id,
-                service_id=line.get('service_id', 0),  # May not be available in frontend
-                service_name=line['service_name'],
-                quantity=line['quantity'],
-                unit_price=float(line['unit_price']),
-                line_total=float(line['line_total']),
-                discount_amount=float(line['discount_amount']),
-                final_amount=float(line['final_amount'])
-            )
-            db.session.add(service_record)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error saving estimate: {str(e)}'}), 500
+
+# Estimate drafts: built up change by change, priced incrementally (see drafts.py)
+def _get_draft(draft_id):
+    """The current user's draft, or None; other users' drafts are reported as missing"""
+    draft = db.session.get(EstimateDraft, draft_id)
+    if draft is None or draft.user_id != current_user.id:
+        return None
+    return draft
+
+def _draft_response(tariff, draft, estimate_lines, summary):
+    patient_cat = tariff.patient_categories.get(draft.patient_category) or \
+        CategoryEntry(None, draft.patient_category, draft.patient_category)
+    data = {'patient_name': draft.patient_name, 'patient_uhid': draft.patient_uhid}
+    return dict(_build_estimate(data, patient_cat, draft.length_of_stay, estimate_lines, summary),
+                draft_id=draft.id)
+
+@main.route('/api/drafts', methods=['POST'])
+@login_required
+@query_budget(5)
+def create_draft():
+    """Start a draft from patient details and an optional initial selected_services list"""
+    try:
+        data = request.get_json() or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
         
+        tariff = get_tariff()
+        required_fields = ['patient_name', 'patient_category', 'length_of_stay']
+        error, parsed = _parse_estimate_request(tariff, data, required_fields, require_services=False)
+        if error:
+            return jsonify({'error': error}), 400
+        patient_cat, length_of_stay, services = parsed
+        
+        draft, estimate_lines, summary = drafts.create(
+            tariff, current_user.id, data['patient_name'], data.get('patient_uhid', ''),
+            patient_cat, length_of_stay, services)
+        db.session.commit()
+        
+        return jsonify(_draft_response(tariff, draft, estimate_lines, summary)), 201
+        
+    except (TypeError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({'error': f'Invalid draft: {str(e)}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error creating draft: {str(e)}'}), 500
+
+@main.route('/api/drafts/<int:draft_id>', methods=['GET'])
+@login_required
+@query_budget(2)
+def get_draft(draft_id):
+    """A draft's patient details, lines and summary"""
+    draft = _get_draft(draft_id)
+    if draft is None:
+        return jsonify({'error': 'Draft not found'}), 404
+    estimate_lines, summary = drafts.estimate(draft)
+    return jsonify(_draft_response(get_tariff(), draft, estimate_lines, summary))
+
+@main.route('/api/drafts/<int:draft_id>', methods=['PATCH'])
+@login_required
+@query_budget(5)
+def update_draft(draft_id):
+    """Apply a change to a draft and return only what it changed.
+    
+    Body (every key optional): add_services, remove_services (lists of service ids),
+    length_of_stay, patient_category, patient_name, patient_uhid, reprice (true to
+    reprice every line against the current catalog). Responds with the repriced or
+    added lines as changed_lines, removed_service_ids and the new summary.
+    """
+    try:
+        draft = _get_draft(draft_id)
+        if draft is None:
+            return jsonify({'error': 'Draft not found'}), 404
+        
+        changes = request.get_json() or {}
+        if not isinstance(changes, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        
+        tariff = get_tariff()
+        try:
+            changed, removed, summary = drafts.apply_changes(tariff, draft, changes)
+        except drafts.DraftError as e:
+            return jsonify({'error': str(e)}), 400
+        # Built before commit, which would expire the draft and reload it
+        response = _draft_response(tariff, draft, changed, summary)
+        response['changed_lines'] = response.pop('estimate_lines')
+        response['removed_service_ids'] = removed
+        db.session.commit()
+        
+        return jsonify(response)
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error updating draft: {str(e)}'}), 500
+
+@main.route('/api/drafts/<int:draft_id>/save', methods=['POST'])
+@login_required
+@query_budget(11)
+def save_draft(draft_id):
+    """Save a draft as a SavedEstimate, using its already priced lines, and delete the draft"""
+    try:
+        draft = _get_draft(draft_id)
+        if draft is None:
+            return jsonify({'error': 'Draft not found'}), 404
+        
+        estimate_lines, summary = drafts.estimate(draft)
+        if not estimate_lines:
+            return jsonify({'error': 'No valid services selected'}), 400
+        
+        estimate_data = _draft_response(get_tariff(), draft, estimate_lines, summary)
+        del estimate_data['draft_id']
+        new_number, estimate_id = _persist_estimate(
+            estimate_data, draft.patient_name, draft.patient_uhid, draft.patient_category, draft.length_of_stay)
+        drafts.discard(draft)
         db.session.commit()
         
         return jsonify({
             'message': 'Estimate saved successfully',
             'estimate_number': new_number,
-            'estimate_id': saved_estimate.id
+            'estimate_id': estimate_id
         })
         
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': f'Error saving estimate: {str(e)}'}), 500
+        return jsonify({'error': f'Error saving draft: {str(e)}'}), 500
+
+@main.route('/api/drafts/<int:draft_id>', methods=['DELETE'])
+@login_required
+@query_budget(3)
+def delete_draft(draft_id):
+    """Discard a draft"""
+    draft = _get_draft(draft_id)
+    if draft is None:
+        return jsonify({'error': 'Draft not found'}), 404
+    drafts.discard(draft)
+    db.session.commit()
+    return jsonify({'message': 'Draft deleted'})
+
+def _filter_saved_estimates(query, args):
+    """Apply the date_from / date_to (YYYY-MM-DD, inclusive) and patient_category filters"""
+    if args.get('date_from'):
+        query = query.filter(SavedEstimate.created_at >= datetime.strptime(args['date_from'], '%Y-%m-%d'))
+    if args.get('date_to'):
+        date_to = datetime.strptime(args['date_to'], '%Y-%m-%d') + timedelta(days=1)
+        query = query.filter(SavedEstimate.created_at < date_to)
+    if args.get('patient_category'):
+        query = query.filter(SavedEstimate.patient_category == args['patient_category'])
+    return query
 
 @main.route('/api/saved-estimates', methods=['GET'])
 @login_required
+@query_budget(1)
 def get_saved_estimates():
-    """Get list of saved estimates"""
+    """Get list of saved estimates
+    
+    Optional filters: date_from / date_to (YYYY-MM-DD, inclusive) and patient_category.
+    With limit or cursor the listing is paginated newest first by (created_at, id) and
+    returned as {"estimates": [...], "next_cursor": token or null}.
+    """
     try:
-        print(f"\n=== SAVED ESTIMATES API CALLED ===")
-        print(f"Current user: {current_user.username} (ID: {current_user.id})")
-        print(f"User role: {current_user.role}")
-        print(f"Is admin: {current_user.is_admin}")
-        
         # Check if admin wants to view all estimates
         view_all = request.args.get('view_all', 'false').lower() == 'true'
-        print(f"View all parameter: {view_all}")
         
-        # Check total estimates in database
-        total_estimates = SavedEstimate.query.count()
-        print(f"Total estimates in database: {total_estimates}")
+        # Only the listed columns, with the username from a single join
+        query = db.session.query(
+            SavedEstimate.id, SavedEstimate.estimate_number, SavedEstimate.patient_name,
+            SavedEstimate.patient_uhid, SavedEstimate.patient_category, SavedEstimate.final_total,
+            SavedEstimate.generated_by_role, SavedEstimate.created_at, User.username
+        ).join(User, SavedEstimate.generated_by_user_id == User.id)
         
         # Admin can choose to see all estimates or just their own
         # Managers and Users only see their own estimates  
-        if current_user.is_admin and view_all:
-            print("Admin viewing ALL estimates")
-            estimates = SavedEstimate.query.order_by(SavedEstimate.created_at.desc()).all()
-        else:
+        view_all = current_user.is_admin and view_all
+        if not view_all:
             # Default behavior: show only current user's estimates
-            print(f"Viewing estimates for user ID: {current_user.id}")
-            estimates = SavedEstimate.query.filter_by(generated_by_user_id=current_user.id).order_by(SavedEstimate.created_at.desc()).all()
+            query = query.filter(SavedEstimate.generated_by_user_id == current_user.id)
         
-        print(f"Found {len(estimates)} estimates for this query")
+        paginated = 'limit' in request.args or 'cursor' in request.args
+        try:
+            args = request.args
+            query = _filter_saved_estimates(query, args)
+            if args.get('cursor'):
+                created_at, last_id = _decode_cursor(args['cursor'])
+                created_at = datetime.fromisoformat(created_at)
+                query = query.filter(or_(
+                    SavedEstimate.created_at < created_at,
+                    and_(SavedEstimate.created_at == created_at, SavedEstimate.id < int(last_id))
+                ))
+            limit = _page_limit(default=50, maximum=500) if paginated else None
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid query parameter: {str(e)}'}), 400
         
-        # Debug: Print details of each estimate
-        for est in estimates:
-            print(f"  Estimate {est.id}: {est.estimate_number} by user {est.generated_by_user_id}")
+        query = query.order_by(SavedEstimate.created_at.desc(), SavedEstimate.id.desc())
+        if paginated:
+            # Fetch one extra row to learn whether another page follows
+            estimates = query.limit(limit + 1).all()
+            next_cursor = None
+            if len(estimates) > limit:
+                last = estimates[limit - 1]
+                next_cursor = _encode_cursor(last.created_at.isoformat(), last.id)
+                estimates = estimates[:limit]
+        else:
+            estimates = query.all()
         
         result = [{
             'id': est.id,
@@ -809,48 +1136,126 @@ def get_saved_estimates():
             'patient_category': est.patient_category,
             'total_amount': float(est.final_total),  # Frontend expects 'total_amount'
             'generated_by_role': est.generated_by_role,
-            'generated_by': est.generated_by_user.username,  # Frontend expects 'generated_by'
+            'generated_by': est.username,  # Frontend expects 'generated_by'
             'created_at': est.created_at.strftime('%Y-%m-%d %H:%M:%S')
         } for est in estimates]
         
-        print(f"Returning {len(result)} estimates")
-        print("=== END SAVED ESTIMATES API ===\n")
+        applog.debug('saved estimates listed', user_id=current_user.id, role=current_user.role,
+                     view_all=view_all, paginated=paginated, count=len(result))
         
+        if paginated:
+            return jsonify({'estimates': result, 'next_cursor': next_cursor})
         return jsonify(result)
         
     except Exception as e:
-        print(f"ERROR in saved estimates API: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        applog.exception('saved estimates listing failed', user_id=current_user.id)
         return jsonify({'error': f'Error retrieving estimates: {str(e)}'}), 500
 
+# Export streams estimates with their lines in chunks: the response starts with the
+# first chunk and memory stays flat however many estimates match.
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXPORT_ESTIMATE_COLUMNS = [SavedEstimate.estimate_number, SavedEstimate.created_at, SavedEstimate.patient_name,
+                           SavedEstimate.patient_uhid, SavedEstimate.patient_category, SavedEstimate.length_of_stay,
+                           SavedEstimate.subtotal, SavedEstimate.total_discount, SavedEstimate.final_total,
+                           User.username.label('generated_by')]
+EXPORT_LINE_COLUMNS = [SavedEstimateService.service_id, SavedEstimateService.service_name,
+                       SavedEstimateService.quantity, SavedEstimateService.unit_price, SavedEstimateService.line_total,
+                       SavedEstimateService.discount_amount, SavedEstimateService.final_amount]
+EXPORT_ESTIMATE_FIELDS = [c.key for c in EXPORT_ESTIMATE_COLUMNS]
+EXPORT_LINE_FIELDS = [c.key for c in EXPORT_LINE_COLUMNS]
+
+def _export_chunks(query, chunk_size):
+    """Yield lists of (estimate values, [line values]) tuples, up to chunk_size estimates each
+    
+    Rows are plain tuples in EXPORT_*_FIELDS order with amounts as floats; each chunk
+    costs one estimates fetch and one query for all of its lines.
+    """
+    connection = db.session.connection()
+    result = connection.execution_options(yield_per=chunk_size).execute(query)
+    for rows in result.partitions():
+        lines = {row[0]: [] for row in rows}
+        for line in connection.execute(
+            select(SavedEstimateService.saved_estimate_id, *EXPORT_LINE_COLUMNS)
+            .where(SavedEstimateService.saved_estimate_id.in_(list(lines)))
+            .order_by(SavedEstimateService.saved_estimate_id, SavedEstimateService.id)
+        ):
+            lines[line[0]].append((*line[1:4], float(line[4]), float(line[5]), float(line[6]), float(line[7])))
+        yield [((row[1], row[2].strftime('%Y-%m-%d %H:%M:%S'), *row[3:7],
+                 float(row[7]), float(row[8]), float(row[9]), row[10]), lines[row[0]])
+               for row in rows]
+
+def _export_csv(chunks):
+    """One CSV row per estimate line, estimate columns repeated; estimates without lines get one row"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_ESTIMATE_FIELDS + EXPORT_LINE_FIELDS)
+    yield buffer.getvalue()
+    no_lines = [('',) * len(EXPORT_LINE_FIELDS)]
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(estimate + line for estimate, lines in chunk for line in lines or no_lines)
+        yield buffer.getvalue()
+
+def _export_ndjson(chunks):
+    """One JSON object per estimate, with its lines in a "lines" list"""
+    encode = json.JSONEncoder(separators=(',', ':')).encode
+    for chunk in chunks:
+        yield ''.join(encode({
+            **dict(zip(EXPORT_ESTIMATE_FIELDS, estimate)),
+            'lines': [dict(zip(EXPORT_LINE_FIELDS, line)) for line in lines]
+        }) + '\n' for estimate, lines in chunk)
+
+@main.route('/api/saved-estimates/export', methods=['GET'])
+@login_required
+def export_saved_estimates():
+    """Stream saved estimates and their lines as CSV (default) or NDJSON
+    
+    Same filters and visibility as /api/saved-estimates (view_all, date_from, date_to,
+    patient_category); newest first.
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(EXPORT_FORMATS)}'}), 400
+    
+    query = db.session.query(SavedEstimate.id, *EXPORT_ESTIMATE_COLUMNS) \
+        .join(User, SavedEstimate.generated_by_user_id == User.id)
+    view_all = current_user.is_admin and request.args.get('view_all', 'false').lower() == 'true'
+    if not view_all:
+        query = query.filter(SavedEstimate.generated_by_user_id == current_user.id)
+    try:
+        query = _filter_saved_estimates(query, request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {str(e)}'}), 400
+    query = query.order_by(SavedEstimate.created_at.desc(), SavedEstimate.id.desc()).statement
+    
+    applog.info('saved estimates export started', user_id=current_user.id, format=export_format, view_all=view_all)
+    chunks = _export_chunks(query, current_app.config['EXPORT_CHUNK_SIZE'])
+    body = _export_csv(chunks) if export_format == 'csv' else _export_ndjson(chunks)
+    filename = f"saved-estimates-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    return current_app.response_class(stream_with_context(body), mimetype=EXPORT_FORMATS[export_format], headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no'
+    })
+
 @main.route('/api/saved-estimates/<int:estimate_id>', methods=['GET'])
 @login_required
+@query_budget(1)
 def get_saved_estimate(estimate_id):
     """Get specific saved estimate"""
-    print(f"\n=== GET SAVED ESTIMATE {estimate_id} ===")
-    print(f"Current user: {current_user.username} (ID: {current_user.id})")
-    print(f"User role: {current_user.role}")
-    print(f"Is admin: {current_user.is_admin}")
-    print(f"Is manager: {current_user.is_manager}")
-    
     try:
-        print(f"Querying for estimate ID: {estimate_id}")
-        estimate = SavedEstimate.query.get_or_404(estimate_id)
-        print(f"Found estimate: {estimate.estimate_number}")
-        print(f"Estimate generated by user ID: {estimate.generated_by_user_id}")
+        # estimate_data is deferred on the model; load it with the row
+        estimate = SavedEstimate.query.options(undefer(SavedEstimate.estimate_data)).get_or_404(estimate_id)
         
         # Check permissions
         has_permission = (current_user.is_admin or 
                          current_user.is_manager or 
                          estimate.generated_by_user_id == current_user.id)
-        print(f"Permission check: {has_permission}")
-        
         if not has_permission:
-            print("ACCESS DENIED")
+            applog.info('saved estimate access denied', estimate_id=estimate_id, user_id=current_user.id,
+                        owner_id=estimate.generated_by_user_id)
             return jsonify({'error': 'Access denied'}), 403
         
-        print("ACCESS GRANTED - Building response...")
         response_data = {
             'id': estimate.id,
             'estimate_number': estimate.estimate_number,
@@ -860,21 +1265,98 @@ def get_saved_estimate(estimate_id):
             'length_of_stay': estimate.length_of_stay,
             'total_amount': float(estimate.final_total),  # Fixed: use final_total instead of total_amount
             'created_at': estimate.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'estimate_data': estimate.estimate_data
+            'estimate_data': estimate_storage.decode(estimate.estimate_data)
         }
-        print(f"Response data prepared, estimate_data length: {len(estimate.estimate_data) if estimate.estimate_data else 0}")
-        print("=== END GET SAVED ESTIMATE ===\n")
+        applog.debug('saved estimate served', estimate_id=estimate_id, user_id=current_user.id,
+                     payload_bytes=len(response_data['estimate_data'] or ''))
         
         return jsonify(response_data)
         
     except Exception as e:
-        print(f"ERROR in get_saved_estimate: {str(e)}")
-        print(f"Exception type: {type(e)}")
-        import traceback
-        print(f"Full traceback:\n{traceback.format_exc()}")
-        print("=== END GET SAVED ESTIMATE (ERROR) ===\n")
+        applog.exception('saved estimate lookup failed', estimate_id=estimate_id, user_id=current_user.id)
         return jsonify({'error': f'Error retrieving estimate: {str(e)}'}), 500
 
+@main.route('/api/saved-estimates/<int:estimate_id>/invoice', methods=['GET'])
+@login_required
+@query_budget(1)
+def get_saved_estimate_invoice(estimate_id):
+    """Saved estimate rendered as an HTML invoice; ?print=true adds the print preview controls
+    
+    Renderings are served from the invoice cache when the estimate data is unchanged.
+    """
+    row = db.session.execute(
+        select(SavedEstimate, User.username)
+        .outerjoin(User, SavedEstimate.generated_by_user_id == User.id)
+        .where(SavedEstimate.id == estimate_id)
+        .options(undefer(SavedEstimate.estimate_data))
+    ).first()
+    if row is None:
+        return jsonify({'error': 'Estimate not found'}), 404
+    estimate, username = row
+    
+    has_permission = (current_user.is_admin or
+                      current_user.is_manager or
+                      estimate.generated_by_user_id == current_user.id)
+    if not has_permission:
+        applog.info('saved estimate access denied', estimate_id=estimate_id, user_id=current_user.id,
+                    owner_id=estimate.generated_by_user_id)
+        return jsonify({'error': 'Access denied'}), 403
+    
+    printable = request.args.get('print', 'false').lower() == 'true'
+    
+    def render():
+        estimate_data = json.loads(estimate_storage.decode(estimate.estimate_data) or '{}')
+        patient = estimate_data.get('patient_details') or {}
+        created_at = estimate.created_at + rollups.LOCAL_OFFSET
+        return render_template(
+            'estimate-invoice.html',
+            estimate=estimate,
+            lines=estimate_data.get('estimate_lines') or [],
+            summary=estimate_data.get('summary') or {},
+            patient_category=patient.get('category') or estimate.patient_category,
+            generated_at=estimate_data.get('generated_at') or created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            generated_by=username or estimate_data.get('generated_by') or estimate.generated_by_role.capitalize(),
+            printable=printable
+        )
+    
+    body, etag = cached_invoice(estimate.id, 'print' if printable else 'html', estimate.estimate_data, render)
+    response = current_app.response_class(body, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+# Reporting API
+@main.route('/api/reports/estimate-totals', methods=['GET'])
+@login_required
+@query_budget(1)
+def get_estimate_totals():
+    """Saved estimate totals from the daily rollups
+    
+    Query: group_by = patient_category (default) | service_category | user,
+    date_from / date_to (YYYY-MM-DD, inclusive), by_day (default true). Days run
+    midnight to midnight IST, the time shown on estimates, not UTC.
+    """
+    if not (current_user.is_admin or current_user.is_manager):
+        return jsonify({'error': 'Admin or manager access required'}), 403
+    
+    group_by = request.args.get('group_by', 'patient_category')
+    if group_by not in rollups.GROUPINGS:
+        return jsonify({'error': f'group_by must be one of {", ".join(rollups.GROUPINGS)}'}), 400
+    try:
+        date_from = datetime.strptime(request.args['date_from'], '%Y-%m-%d').date() if request.args.get('date_from') else None
+        date_to = datetime.strptime(request.args['date_to'], '%Y-%m-%d').date() if request.args.get('date_to') else None
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {str(e)}'}), 400
+    by_day = request.args.get('by_day', 'true').lower() == 'true'
+    
+    rows = rollups.report(group_by, date_from, date_to, by_day)
+    return jsonify({
+        'group_by': group_by,
+        'date_from': date_from.isoformat() if date_from else None,
+        'date_to': date_to.isoformat() if date_to else None,
+        'rows': rows
+    })
+
 # Debug endpoint to check database
 @main.route('/api/debug/estimates', methods=['GET'])
 @login_required
@@ -0,0 +1,165 @@
+"""Typeahead search over service names.
+
+The index is a sorted array of (token, name position) pairs built from the
+tariff snapshot, so the names having a word that starts with a query term are
+one contiguous slice of it, found with two binary searches. A search turns
+each term's slice into a boolean mask over all names, ANDs the masks, and
+ranks the matches with vectorized keys and a partial sort for the top k; the
+work is a few numpy passes over the slices and the name array, not a Python
+loop over candidates.
+
+After a catalog edit the next index is built on a background thread while the
+previous one keeps answering, so a search can briefly miss the edit. Only the
+first search in a process (or after ``catalog.reset()``) builds the index inline.
+"""
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+import numpy as np
+
+from catalog import get_tariff
+import applog
+import metrics
+
+_TOKEN_RE = re.compile(r'\w+')
+# Memoized short-query answers kept per index, least recently used evicted first
+_SHORT_RESULTS_SIZE = 1024
+
+_lock = threading.Lock()
+_index = None
+_building = None  # catalog version being indexed in the background
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class ServiceIndex:
+    def __init__(self, tariff):
+        self.version = tariff.version
+        names = []
+        ids = []
+        pair_tokens = []
+        pair_positions = []
+        for position, service in enumerate(tariff.services.values()):
+            name = service.name.lower()
+            names.append(name)
+            ids.append(service.id)
+            tokens = set(tokenize(name))
+            pair_tokens.extend(tokens)
+            pair_positions.extend([position] * len(tokens))
+        order = np.argsort(np.array(pair_tokens, dtype=str), kind='stable')
+        self._keys = [pair_tokens[i] for i in order]
+        self._positions = np.array(pair_positions, dtype=np.int64)[order]
+        self._names = names
+        self._ids = np.array(ids, dtype=np.int64)
+        self._lengths = np.array([len(name) for name in names], dtype=np.int64)
+        name_order = np.argsort(np.array(names, dtype=str), kind='stable')
+        self._sorted_names = [names[i] for i in name_order]
+        self._sorted_name_positions = name_order.astype(np.int64)
+        # One- and two-character queries match huge ranges; their answers are
+        # memoized for the lifetime of the index, up to _SHORT_RESULTS_SIZE.
+        self._short_results = OrderedDict()
+        self._short_lock = threading.Lock()
+
+    def _prefix_range(self, prefix):
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + '\uffff', lo)
+        return lo, hi
+
+    def search(self, query, limit=10):
+        """Return up to ``limit`` service ids whose name has a word starting with
+        every query token, best matches first."""
+        query = query.strip().lower()
+        if len(query) <= 2:
+            key = (query, limit)
+            with self._short_lock:
+                result = self._short_results.get(key)
+                if result is not None:
+                    self._short_results.move_to_end(key)
+                    return result
+            result = self._search(query, limit)
+            with self._short_lock:
+                self._short_results[key] = result
+                while len(self._short_results) > _SHORT_RESULTS_SIZE:
+                    self._short_results.popitem(last=False)
+            return result
+        return self._search(query, limit)
+
+    def _mask(self, lo, hi):
+        mask = np.zeros(len(self._names), dtype=bool)
+        mask[self._positions[lo:hi]] = True
+        return mask
+
+    def _search(self, query, limit):
+        terms = set(tokenize(query))
+        if not terms or limit < 1:
+            return []
+
+        # Smallest slice first, so an empty one ends the search before any mask is built
+        ranges = sorted((self._prefix_range(term) for term in terms), key=lambda r: r[1] - r[0])
+        if ranges[0][0] == ranges[0][1]:
+            return []
+        matched = self._mask(*ranges[0])
+        for lo, hi in ranges[1:]:
+            matched &= self._mask(lo, hi)
+        candidates = np.flatnonzero(matched)
+        if not len(candidates):
+            return []
+
+        # Rank: names starting with the whole query, then more query terms that
+        # are whole words of the name, then shorter names, then lower ids.
+        name_lo = bisect_left(self._sorted_names, query)
+        name_hi = bisect_left(self._sorted_names, query + '\uffff', name_lo)
+        not_prefix = np.ones(len(self._names), dtype=np.int64)
+        not_prefix[self._sorted_name_positions[name_lo:name_hi]] = 0
+        exact = np.zeros(len(self._names), dtype=np.int64)
+        for term in terms:
+            # Each name lists a token once, so a slice holds no repeated positions
+            exact[self._positions[bisect_left(self._keys, term):bisect_right(self._keys, term)]] += 1
+        # One int64 key per candidate: 1 bit | 6 bits | 16 bits | 32 bits
+        keys = (((not_prefix[candidates] << 6 | (63 - np.minimum(exact[candidates], 63))) << 16
+                 | np.minimum(self._lengths[candidates], 0xFFFF)) << 32) | self._ids[candidates]
+        if len(keys) > limit:
+            keys = keys[np.argpartition(keys, limit - 1)[:limit]]
+        keys.sort()
+        return (keys & 0xFFFFFFFF).tolist()
+
+
+def _rebuild(tariff):
+    global _index, _building
+    try:
+        index = ServiceIndex(tariff)
+        with _lock:
+            if _index is None or _index.version < index.version:
+                _index = index
+    except Exception:
+        applog.exception('search index rebuild failed', version=tariff.version)
+    finally:
+        with _lock:
+            if _building == tariff.version:
+                _building = None
+
+
+def get_index():
+    """Return the ServiceIndex for the current catalog version, or the previous
+    one while the current one is being built."""
+    global _index, _building
+    tariff = get_tariff()
+    index = _index
+    if index is not None and index.version == tariff.version:
+        metrics.cache_hit('search_index')
+        return index
+    with _lock:
+        # A new generation means catalog.reset() pointed us at another database
+        if _index is None or _index.version[0] != tariff.version[0]:
+            metrics.cache_miss('search_index')
+            _index = ServiceIndex(tariff)
+            return _index
+        if _index.version != tariff.version and _building != tariff.version:
+            metrics.cache_miss('search_index')
+            _building = tariff.version
+            threading.Thread(target=_rebuild, args=(tariff,), name='search-index', daemon=True).start()
+        return _index
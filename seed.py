@@ -0,0 +1,69 @@
+"""Default categories and user accounts.
+
+Seeding runs as a schema migration (see migrations.MIGRATIONS), so it happens
+once per database and is skipped, with everything else, by the single
+version check at startup. Each table is filled with one bulk
+insert-or-ignore, which leaves rows that already exist untouched.
+"""
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from werkzeug.security import generate_password_hash
+
+from models import db, User, ServiceCategory, PatientCategory
+
+SERVICE_CATEGORIES = [
+    ('nursing', 'Nursing'), ('room', 'Room Charges'), ('doctor', 'Doctor Visit'),
+    ('laboratory', 'Laboratory'), ('radiology', 'Radiology'), ('pharmacy', 'Pharmacy'),
+    ('equipment', 'Equipment'), ('procedures', 'Procedures'), ('surgery', 'Surgery')
+]
+
+PATIENT_CATEGORIES = [
+    ('charity', 'Charity'), ('general_nc_a', 'General NC A'), ('general_nc_b', 'General NC B'),
+    ('general', 'General'), ('deluxe', 'Deluxe'), ('super_deluxe', 'Super Deluxe')
+]
+
+# (username, role, password): the admin account and a test user for the user dashboard
+USERS = [
+    ('admin', 'admin', 'admin'),
+    ('testuser', 'user', 'testuser'),
+]
+
+
+def insert_or_ignore(table, rows, key='name'):
+    """Insert ``rows``, skipping any that collide with a unique key, in one statement.
+
+    ``key`` is the unique column used to filter out existing rows on databases
+    without a native insert-or-ignore.
+    """
+    if not rows:
+        return
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        statement = sqlite.insert(table).on_conflict_do_nothing()
+    elif dialect == 'postgresql':
+        statement = postgresql.insert(table).on_conflict_do_nothing()
+    else:
+        existing = set(db.session.execute(select(table.c[key])).scalars())
+        rows = [row for row in rows if row[key] not in existing]
+        statement = table.insert()
+    if rows:
+        db.session.execute(statement, rows)
+
+
+def seed_defaults():
+    """Create the default service/patient categories and users in the current transaction."""
+    insert_or_ignore(ServiceCategory.__table__, [
+        {'name': name, 'display_name': display_name} for name, display_name in SERVICE_CATEGORIES
+    ])
+    insert_or_ignore(PatientCategory.__table__, [
+        {'name': name, 'display_name': display_name} for name, display_name in PATIENT_CATEGORIES
+    ])
+
+    # Hashing is deliberately slow; only hash for accounts that are actually missing
+    existing = set(db.session.execute(
+        select(User.username).where(User.username.in_([username for username, _, _ in USERS]))
+    ).scalars())
+    insert_or_ignore(User.__table__, [{
+        'username': username, 'role': role, 'approved': True, 'rejected': False,
+        'password': generate_password_hash(password)
+    } for username, role, password in USERS if username not in existing], key='username')
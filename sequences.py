@@ -0,0 +1,79 @@
+"""Contention-free sequence numbers.
+
+Numbers come from a one-row-per-sequence table rather than from scanning the
+table they label. Each allocation is a single ``UPDATE ... SET next_value =
+next_value + n`` in its own short transaction, so concurrent savers never read
+the same value and never hold the write lock for longer than that statement.
+
+With ``block_size > 1`` a process reserves a block of numbers at a time and
+hands them out from memory; numbers then stay unique but are no longer gap-free
+or strictly ordered by creation time across processes.
+"""
+import threading
+
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Sequence, SavedEstimate
+
+
+def _max_estimate_number(conn):
+    """Largest numeric suffix among existing EST### numbers (0 if none)."""
+    numbers = conn.execute(select(SavedEstimate.estimate_number)).scalars()
+    return max((int(n[3:]) for n in numbers if n[3:].isdigit()), default=0)
+
+
+# Seed for a sequence row that does not exist yet: conn -> last value already used
+SEEDS = {
+    'estimate_number': _max_estimate_number,
+}
+
+
+class SequenceAllocator:
+    def __init__(self, app=None, name='estimate_number', block_size=1):
+        self.name = name
+        self.block_size = max(1, block_size)
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions.setdefault('sequences', {})[self.name] = self
+
+    def next_value(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._next = self._reserve(self.block_size)
+                self._end = self._next + self.block_size
+            value = self._next
+            self._next += 1
+            return value
+
+    def _reserve(self, count):
+        """Claim ``count`` consecutive values; returns the first."""
+        table = Sequence.__table__
+        while True:
+            with db.engine.begin() as conn:
+                claimed = conn.execute(
+                    update(table)
+                    .where(table.c.name == self.name)
+                    .values(next_value=table.c.next_value + count)
+                )
+                if claimed.rowcount:
+                    # Still inside the write transaction, so nobody else has moved it
+                    end = conn.execute(select(table.c.next_value).where(table.c.name == self.name)).scalar_one()
+                    return end - count
+            try:
+                with db.engine.begin() as conn:
+                    seed = SEEDS.get(self.name, lambda conn: 0)(conn)
+                    conn.execute(table.insert().values(name=self.name, next_value=seed + 1))
+            except IntegrityError:
+                pass  # another process created it first; retry the update
+
+
+def next_estimate_number():
+    """Allocate the next EST### estimate number for the current app."""
+    return f"EST{current_app.extensions['sequences']['estimate_number'].next_value():03d}"
@@ -0,0 +1,25 @@
+"""Per-connection SQLite PRAGMAs.
+
+PRAGMAs such as busy_timeout, synchronous and cache_size only last for the
+connection that sets them, so they are applied from the engine's ``connect``
+event to every connection the pool opens. Other databases are left alone.
+"""
+from sqlalchemy import event
+
+
+def _apply(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def init_app(app, db):
+    pragmas = dict(app.config.get('SQLITE_PRAGMAS') or {})
+    with app.app_context():
+        if pragmas and db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _apply(pragmas))
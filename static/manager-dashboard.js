@@ -20,6 +20,47 @@ function showMessage(message, type) {
     }, 3000);
 }
 
+// Bulk uploads run as background jobs: post with ?async=true, then poll the
+// job until it finishes. Resolves to { ok, result }, where result has the same
+// shape as a synchronous upload response (success_count/errors, or error).
+async function runUploadJob(url, formData, onProgress) {
+    async function readJson(response) {
+        try {
+            return await response.json();
+        } catch (jsonError) {
+            console.error('JSON parsing error:', jsonError);
+            return { error: 'Invalid server response. Please try again.' };
+        }
+    }
+
+    const response = await fetch(`${url}?async=true`, {
+        method: 'POST',
+        body: formData
+    });
+    const accepted = await readJson(response);
+    if (response.status !== 202) {
+        return { ok: response.ok, result: accepted };
+    }
+
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const jobResponse = await fetch(accepted.status_url);
+        const job = await readJson(jobResponse);
+        if (!jobResponse.ok) {
+            return { ok: false, result: job };
+        }
+        if (job.status === 'completed') {
+            return { ok: true, result: job.result };
+        }
+        if (job.status === 'failed') {
+            return { ok: false, result: { error: job.error } };
+        }
+        if (onProgress && job.progress.processed_rows !== undefined) {
+            onProgress(job.progress);
+        }
+    }
+}
+
 // Global function for opening service modal (available immediately)
 window.openServiceModal = function(service = null) {
     console.log('Manager openServiceModal called with:', service);
@@ -1048,22 +1089,14 @@ document.addEventListener('DOMContentLoaded', function() {
         formData.append('file', file);
 
         try {
-            const response = await fetch('/api/bulk-upload/services', {
-                method: 'POST',
-                body: formData
+            const resultDiv = document.getElementById('upload-result');
+            const { ok, result } = await runUploadJob('/api/bulk-upload/services', formData, progress => {
+                resultDiv.innerHTML = `<div class="alert alert-info">
+                    Processing... ${progress.processed_rows} rows read, ${progress.success_count} saved
+                </div>`;
             });
 
-            let result;
-            try {
-                result = await response.json();
-            } catch (jsonError) {
-                console.error('JSON parsing error:', jsonError);
-                showMessage('Invalid server response. Please try again.', 'error');
-                return;
-            }
-
-            if (response.ok) {
-                const resultDiv = document.getElementById('upload-result');
+            if (ok) {
                 let html = `<div class="alert alert-success">
                     Successfully uploaded ${result.success_count} services!
                 </div>`;
@@ -1084,6 +1117,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 fileInputContainer.style.display = 'block';
                 fileSelectedContainer.style.display = 'none';
             } else {
+                resultDiv.innerHTML = '';
                 showMessage(result.error || 'Error uploading services', 'error');
             }
         } catch (error) {
@@ -1266,228 +1300,14 @@ async function viewSavedEstimate(estimateId) {
 }
 
 async function printSavedEstimate(estimateId) {
-    console.log('🖨️ MANAGER: printSavedEstimate called with ID:', estimateId);
-    try {
-        console.log('🖨️ MANAGER: Fetching estimate details...');
-        const response = await fetch(`/api/saved-estimates/${estimateId}`);
-        console.log('🖨️ MANAGER: Response status:', response.status);
-        if (!response.ok) {
-            throw new Error('Failed to load estimate details');
-        }
-        
-        const estimate = await response.json();
-        console.log('🖨️ MANAGER: Estimate data received:', estimate);
-        const estimateData = JSON.parse(estimate.estimate_data);
-        console.log('🖨️ MANAGER: Parsed estimate data:', estimateData);
-        console.log('🖨️ MANAGER: estimateData.patient:', estimateData.patient);
-        console.log('🖨️ MANAGER: estimateData.estimate_lines:', estimateData.estimate_lines);
-        console.log('🖨️ MANAGER: estimateData.summary:', estimateData.summary);
-        
-        // Reconstruct patient object if it doesn't exist in estimateData
-        if (!estimateData.patient) {
-            estimateData.patient = {
-                name: estimate.patient_name,
-                uhid: estimate.patient_uhid,
-                category: estimate.patient_category || 'N/A',
-                lengthOfStay: estimate.length_of_stay || 1
-            };
-            console.log('🖨️ MANAGER: Reconstructed patient object:', estimateData.patient);
-        }
-        
-        // Create print window with estimate data
-        console.log('🖨️ MANAGER: Creating print window...');
-        const printWindow = window.open('', '_blank', 'width=800,height=600,scrollbars=yes');
-        console.log('🖨️ MANAGER: Print window created:', printWindow);
-        
-        if (!printWindow) {
-            throw new Error('Print window could not be opened. Please check popup blocker settings.');
-        }
-        
-        // Build the estimate HTML content using the original format
-        let estimateHTML = `
-            <div class="invoice-header" style="border-bottom: 2px solid var(--border); padding-bottom: 1rem; margin-bottom: 1rem;">
-                <h4 style="margin: 0 0 0.5rem 0; color: var(--primary);">MEDICAL ESTIMATE</h4>
-                <div style="font-size: 0.875rem; color: var(--muted-foreground);">
-                    <div><strong>Generated:</strong> ${new Date(estimate.created_at).toLocaleDateString()} at ${new Date(estimate.created_at).toLocaleTimeString()}</div>
-                    <div><strong>Generated by:</strong> ${estimateData.generated_by || 'Manager'}</div>
-                    <div><strong>Estimate Number:</strong> ${estimate.estimate_number}</div>
-                </div>
-            </div>
-            
-            <div class="patient-info" style="background: var(--accent); padding: 1rem; border-radius: 6px; margin-bottom: 1rem;">
-                <h5 style="margin: 0 0 0.5rem 0;">Patient Information</h5>
-                <div style="font-size: 0.875rem;">
-                    <div><strong>Name:</strong> ${estimateData.patient.name}</div>
-                    <div><strong>UHID:</strong> ${estimateData.patient.uhid || 'N/A'}</div>
-                    <div><strong>Category:</strong> ${estimateData.patient.category}</div>
-                    <div><strong>Length of Stay:</strong> ${estimateData.patient.lengthOfStay} day(s)</div>
-                </div>
-            </div>
-            
-            <div class="services-breakdown" style="margin-bottom: 1rem;">
-                <h5 style="margin: 0 0 0.75rem 0;">Services & Charges</h5>
-                <div class="services-table">
-                    ${estimateData.estimate_lines.map(line => `
-                        <div class="estimate-line-item" style="border-bottom: 1px solid var(--border); padding: 0.75rem 0;">
-                            <div style="display: flex; justify-content: space-between; align-items: start; margin-bottom: 0.25rem;">
-                                <div style="flex: 1;">
-                                    <div style="font-weight: 600;">${line.service_name}</div>
-                                    <div style="font-size: 0.75rem; color: var(--muted-foreground);">${line.category || 'Service'}</div>
-                                </div>
-                                <div style="text-align: right; min-width: 100px;">
-                                    <div style="font-weight: 600;">₹${line.final_amount.toFixed(2)}</div>
-                                </div>
-                            </div>
-                            <div style="font-size: 0.75rem; color: var(--muted-foreground); display: flex; justify-content: space-between;">
-                                <span>₹${line.unit_price.toFixed(2)} × ${line.quantity} = ₹${(line.unit_price * line.quantity).toFixed(2)}</span>
-                                ${line.discount_amount > 0 ? `<span style="color: var(--primary);">-₹${line.discount_amount.toFixed(2)} discount</span>` : ''}
-                            </div>
-                        </div>
-                    `).join('')}
-                </div>
-            </div>
-            
-            <div class="estimate-summary" style="background: var(--accent); padding: 1rem; border-radius: 6px;">
-                <div class="summary-line" style="display: flex; justify-content: space-between; margin-bottom: 0.5rem;">
-                    <span>Subtotal:</span>
-                    <span>₹${estimateData.summary.subtotal.toFixed(2)}</span>
-                </div>
-                ${estimateData.summary.total_discount > 0 ? `
-                <div class="summary-line" style="display: flex; justify-content: space-between; margin-bottom: 0.5rem; color: var(--primary);">
-                    <span>Total Discount:</span>
-                    <span>-₹${estimateData.summary.total_discount.toFixed(2)}</span>
-                </div>
-                ` : ''}
-                <div class="summary-line" style="display: flex; justify-content: space-between; font-size: 1.1rem; font-weight: 600; border-top: 1px solid var(--border); padding-top: 0.5rem;">
-                    <span>Total Amount:</span>
-                    <span style="color: var(--primary);">₹${estimateData.summary.final_total.toFixed(2)}</span>
-                </div>
-            </div>
-            
-            <div style="margin-top: 1rem; padding: 0.75rem; background: #fff3cd; border-radius: 6px; font-size: 0.875rem;">
-                <strong>Note:</strong> This is an estimated cost. Actual charges may vary based on treatment requirements and additional services.
-            </div>
-        `;
-        
-        console.log('🖨️ MANAGER: Writing HTML to print window...');
-        printWindow.document.write(`
-            <html>
-            <head>
-                <title>Medical Estimate ${estimate.estimate_number} - Print Preview</title>
-                <style>
-                    body { 
-                        font-family: Arial, sans-serif; 
-                        margin: 20px;
-                        background: #f5f5f5;
-                    }
-                    .print-container {
-                        background: white;
-                        padding: 30px;
-                        margin: 20px auto;
-                        max-width: 800px;
-                        box-shadow: 0 0 10px rgba(0,0,0,0.1);
-                        border-radius: 8px;
-                    }
-                    .print-header {
-                        text-align: center;
-                        margin-bottom: 20px;
-                        padding: 10px;
-                        background: #f8f9fa;
-                        border-radius: 5px;
-                    }
-                    .invoice-header { 
-                        border-bottom: 2px solid #0066cc; 
-                        padding-bottom: 15px; 
-                        margin-bottom: 20px; 
-                    }
-                    .patient-info { 
-                        background: #f8f9fa; 
-                        padding: 15px; 
-                        margin-bottom: 15px; 
-                        border-radius: 5px;
-                    }
-                    .estimate-summary { 
-                        background: #f8f9fa; 
-                        padding: 15px; 
-                        border-radius: 5px;
-                    }
-                    .estimate-line-item { 
-                        border-bottom: 1px solid #ddd; 
-                        padding: 12px 0; 
-                    }
-                    .summary-line { 
-                        display: flex; 
-                        justify-content: space-between; 
-                        margin-bottom: 8px; 
-                    }
-                    .print-buttons {
-                        text-align: center;
-                        margin: 20px 0;
-                        padding: 15px;
-                        background: #e9ecef;
-                        border-radius: 5px;
-                    }
-                    .btn {
-                        padding: 10px 20px;
-                        margin: 0 10px;
-                        border: none;
-                        border-radius: 5px;
-                        cursor: pointer;
-                        font-size: 14px;
-                    }
-                    .btn-primary {
-                        background: #0066cc;
-                        color: white;
-                    }
-                    .btn-secondary {
-                        background: #6c757d;
-                        color: white;
-                    }
-                    @media print { 
-                        body { 
-                            margin: 0; 
-                            background: white;
-                        }
-                        .print-container {
-                            box-shadow: none;
-                            margin: 0;
-                            padding: 20px;
-                        }
-                        .print-header, .print-buttons { 
-                            display: none; 
-                        }
-                    }
-                </style>
-            </head>
-            <body>
-                <div class="print-container">
-                    <div class="print-header">
-                        <h2 style="margin: 0; color: #0066cc;">Medical Estimate - Print Preview</h2>
-                        <p style="margin: 5px 0; color: #666;">Review the estimate below and click Print to generate PDF or print</p>
-                    </div>
-                    
-                    <div class="print-buttons">
-                        <button class="btn btn-primary" onclick="window.print()">🖨️ Print / Save as PDF</button>
-                        <button class="btn btn-secondary" onclick="window.close()">❌ Close</button>
-                    </div>
-                    
-                    <div class="estimate-content">
-                        ${estimateHTML}
-                    </div>
-                </div>
-            </body>
-            </html>
-        `);
-        
-        console.log('🖨️ MANAGER: HTML written, closing document and focusing...');
-        printWindow.document.close();
-        printWindow.focus();
-        console.log('🖨️ MANAGER: Print window setup complete!');
-        
-    } catch (error) {
-        console.error('🖨️ MANAGER: Error printing estimate:', error);
-        showMessage('Failed to print estimate. Please try again.', 'error');
+    // The invoice is rendered (and cached) server-side; open its print preview directly
+    const printWindow = window.open(`/api/saved-estimates/${estimateId}/invoice?print=true`, '_blank', 'width=800,height=600,scrollbars=yes');
+    if (!printWindow) {
+        console.error('🖨️ MANAGER: Print window could not be opened');
+        showMessage('Print window could not be opened. Please check popup blocker settings.', 'error');
+        return;
     }
+    printWindow.focus();
 }
 
 // ========================================
@@ -1598,22 +1418,14 @@ async function handleBulkDiscountUpload() {
     formData.append('file', file);
 
     try {
-        const response = await fetch('/api/bulk-upload/discounts', {
-            method: 'POST',
-            body: formData
+        const resultDiv = document.getElementById('discount-upload-result');
+        const { ok, result } = await runUploadJob('/api/bulk-upload/discounts', formData, progress => {
+            resultDiv.innerHTML = `<div class="alert alert-info">
+                Processing... ${progress.processed_rows} rows read, ${progress.success_count} saved
+            </div>`;
         });
 
-        let result;
-        try {
-            result = await response.json();
-        } catch (jsonError) {
-            console.error('JSON parsing error:', jsonError);
-            showMessage('Invalid server response. Please try again.', 'error');
-            return;
-        }
-
-        if (response.ok) {
-            const resultDiv = document.getElementById('discount-upload-result');
+        if (ok) {
             let html = `<div class="alert alert-success">
                 Successfully uploaded ${result.success_count} discounts!
             </div>`;
@@ -1658,6 +1470,7 @@ async function handleBulkDiscountUpload() {
             refreshDiscountTableAfterUpload();
             
         } else {
+            resultDiv.innerHTML = '';
             showMessage(result.error || 'Error uploading discounts', 'error');
         }
     } catch (error) {
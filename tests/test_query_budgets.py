@@ -0,0 +1,8 @@
+import query_budget
+from app import create_app
+
+
+def test_endpoints_stay_within_query_budgets():
+    problems = {call: problems for call, (counts, budget, problems) in query_budget.check(create_app).items()
+                if problems}
+    assert not problems
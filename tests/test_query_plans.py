@@ -0,0 +1,12 @@
+import query_plans
+from app import create_app
+from models import db
+
+
+def test_hot_queries_use_indexes(tmp_path):
+    # create_app applies every migration to the scratch database
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "plans.db"}'})
+    with app.app_context():
+        problems = {name: (plan, problems) for name, (plan, problems) in query_plans.check().items() if problems}
+        db.engine.dispose()
+    assert not problems
@@ -0,0 +1,80 @@
+"""In-process cache of the identity fields Flask-Login needs for each request.
+
+The user loader runs on every authenticated request. Instead of loading the
+full User row each time, it returns a small UserIdentity (id, username, role,
+approved, rejected) from a bounded LRU cache whose entries expire after
+USER_CACHE_TTL seconds. Views that change those fields call
+``invalidate_user``; other worker processes pick the change up when their
+entry expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import select
+
+from models import db, User, RoleMixin
+import metrics
+
+
+class UserIdentity(UserMixin, RoleMixin):
+    __slots__ = ('id', 'username', 'role', 'approved', 'rejected')
+
+    def __init__(self, id, username, role, approved, rejected):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.approved = approved
+        self.rejected = rejected
+
+
+class UserCache:
+    def __init__(self, app=None):
+        self._entries = OrderedDict()  # user id -> (expires_at, UserIdentity)
+        self._lock = threading.Lock()
+        self.maxsize = 1024
+        self.ttl = 60.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('USER_CACHE_SIZE', 1024)
+        self.ttl = float(app.config.get('USER_CACHE_TTL', 60))
+        app.extensions['user_cache'] = self
+
+    def get(self, user_id):
+        """Return the UserIdentity for ``user_id``, or None if there is no such user."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        with metrics.cache_refill():
+            row = db.session.execute(
+                select(User.id, User.username, User.role, User.approved, User.rejected).where(User.id == user_id)
+            ).first()
+        if row is None:
+            return None
+        identity = UserIdentity(*row)
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, identity)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return identity
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+def load_user(user_id):
+    return current_app.extensions['user_cache'].get(int(user_id))
+
+
+def invalidate_user(user_id):
+    current_app.extensions['user_cache'].invalidate(int(user_id))